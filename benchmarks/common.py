@@ -0,0 +1,26 @@
+"""Helpers shared by the benchmarks"""
+import sys
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+from completions import Completions  # pylint: disable=wrong-import-position
+
+
+def synthetic(ncommands, noptions=None, name='prog'):
+    """Build a completions spec with given number of commands and options
+
+    `noptions` is the total number of options, a few of them global and the
+    rest spread over the commands. By default, 10 options for each command.
+    """
+    if noptions is None:
+        noptions = 10 * (ncommands + 1)
+    nglobal = min(10, noptions)
+    completions = Completions(name=name, desc='Synthetic program')
+    for i in range(nglobal):
+        completions.add_option('--global%d' % i, 'Global option %d.' % i)
+    per_command = (noptions - nglobal) // max(ncommands, 1)
+    for i in range(ncommands):
+        completions.add_command(
+            'command%d' % i, 'Command %d.' % i,
+            {'--option%d' % j: 'Option %d.' % j for j in range(per_command)})
+    return completions
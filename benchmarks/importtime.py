@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Cold-start import time of the package and the CLI, checked against budgets.
+
+The interpreter is run with `-X importtime` for each case, and the time of
+the imports it does on top of a bare interpreter start is added up:
+- library: `import completions`, as a program completing itself does;
+- cli: `completions generate` for the example configuration, to /dev/null;
+- cli_cached: the same with `--cache`, the configuration loaded from cache.
+
+Usage:
+    python benchmarks/importtime.py [--repeat 5] [--library-budget 10]
+                                    [--cli-budget 150]
+                                    [--cli-cached-budget 100]
+
+The best of the repeated runs is taken for each case. The exit status is 1
+if any of them is over its budget (in milliseconds).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from os import path
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+EXAMPLE = path.join(ROOT, 'examples', 'example.yaml')
+
+CLI = ('import sys; sys.argv = ["completions", "generate", "--shell", '
+       '"bash", "--config", %r%s]; sys.stdout = open("/dev/null", "w"); '
+       'from completions import main; main()')
+CASES = dict(
+    library='import completions',
+    cli=CLI % (EXAMPLE, ''),
+    # the first of the repeated runs fills the cache
+    cli_cached=CLI % (EXAMPLE, ', "--cache"'),
+)
+
+
+def imports(code, env=None):
+    """Run the code with -X importtime, get the top-level imports
+
+    Returns a dict of the modules imported at top level and their
+    cumulative time in microseconds.
+    """
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import sys; sys.path.insert(0, %r); %s' % (ROOT, code)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        universal_newlines=True,
+        check=True).stderr
+    ret = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[12:].split('|')
+        # nested imports are indented
+        if not name.startswith('  ') and cumulative.strip().isdigit():
+            ret[name.strip()] = int(cumulative)
+    return ret
+
+
+def measure(code, repeat, env=None):
+    """The best time of the imports on top of the interpreter start, in ms"""
+    startup = set(imports('pass', env))
+    return min(
+        sum(usec for name, usec in imports(code, env).items()
+            if name not in startup) for _ in range(repeat)) / 1000.0
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--library-budget', type=float, default=10.0)
+    parser.add_argument('--cli-budget', type=float, default=150.0)
+    parser.add_argument('--cli-cached-budget', type=float, default=100.0)
+    args = parser.parse_args()
+
+    over = False
+    cachedir = tempfile.TemporaryDirectory()
+    env = dict(os.environ, XDG_CACHE_HOME=cachedir.name)
+    for case, code in CASES.items():
+        budget = getattr(args, '%s_budget' % case)
+        elapsed = measure(code, args.repeat, env)
+        print(json.dumps(dict(case=case, import_ms=elapsed, budget_ms=budget)))
+        if elapsed > budget:
+            sys.stderr.write('Over budget: %s imports take %.2fms > %.2fms\n' %
+                             (case, elapsed, budget))
+            over = True
+    cachedir.cleanup()
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
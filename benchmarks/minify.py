@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Size and parse time of the generated scripts, as they are and minified.
+
+Synthetic specs of several sizes are generated for bash, zsh and fish, with
+the descriptions of the options shared by the commands, as they often are.
+For each script, plain and minified:
+- the size, in bytes and lines;
+- the time for the shell to parse it without running it (`bash -n`,
+  `zsh -n`, `fish --no-execute`), the best of the runs, less the time of
+  the shell parsing an empty script; only for the shells installed.
+
+Usage:
+    python benchmarks/minify.py [--shells bash zsh fish]
+                                [--sizes 100:1000 1000:10000 10000:100000]
+                                [--repeat 5] [--output results.jsonl]
+
+Sizes are given as <commands>:<options>. Results are written as one JSON
+object per line, for each shell and size, with the ratios of the minified
+script to the plain one.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+from common import synthetic
+
+PARSE_ONLY = dict(bash=['bash', '-n'],
+                  zsh=['zsh', '-n'],
+                  fish=['fish', '--no-execute'])
+
+
+def parse_time(shellname, script, repeat):
+    """The best time of the shell to parse the script, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(PARSE_ONLY[shellname] + [script], check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench(shellname, ncommands, noptions, repeat):
+    """Measure the plain and the minified scripts, return the result"""
+    completions = synthetic(ncommands, noptions)
+    result = dict(shell=shellname, commands=ncommands, options=noptions)
+    installed = shutil.which(PARSE_ONLY[shellname][0])
+    workdir = tempfile.mkdtemp()
+    try:
+        empty = path.join(workdir, 'empty')
+        open(empty, 'w').close()
+        startup = parse_time(shellname, empty, repeat) if installed else 0
+        for kind, minify in (('plain', False), ('minified', True)):
+            source = completions.generate(shellname, minify=minify)
+            script = path.join(workdir, kind)
+            with open(script, 'w') as fscript:
+                fscript.write(source)
+            result[kind + '_bytes'] = len(source.encode())
+            result[kind + '_lines'] = source.count('\n')
+            if installed:
+                result[kind + '_parse_ms'] = (
+                    parse_time(shellname, script, repeat) - startup) * 1e3
+    finally:
+        shutil.rmtree(workdir)
+    for field in ('bytes', 'lines', 'parse_ms'):
+        if 'plain_' + field in result:
+            result[field + '_ratio'] = (result['minified_' + field] /
+                                        max(result['plain_' + field], 1e-9))
+    return result
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--shells', nargs='+', default=list(PARSE_ONLY))
+    parser.add_argument('--sizes', nargs='+',
+                        default=['100:1000', '1000:10000', '10000:100000'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', type=argparse.FileType('w'),
+                        default=sys.stdout)
+    args = parser.parse_args()
+
+    for shellname in args.shells:
+        if not shutil.which(PARSE_ONLY[shellname][0]):
+            sys.stderr.write('%s is not installed, only the sizes are '
+                             'measured.\n' % shellname)
+        for size in args.sizes:
+            ncommands, noptions = (int(num) for num in size.split(':'))
+            result = bench(shellname, ncommands, noptions, args.repeat)
+            args.output.write(json.dumps(result) + '\n')
+            args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+"""
+Runtime cost of the generated scripts in real shells.
+
+Synthetic specs of several sizes are generated for bash, zsh and fish. Each
+shell is driven interactively under a pseudo-terminal to measure:
+- the time to load the script (for zsh, which autoloads the completion file,
+  the first TAB, including the autoload);
+- the per-TAB latency (p50/p99) for representative command lines.
+
+The end of a TAB is detected by a key bound to print a marker, which the
+shell handles only after the completion is done. The round trip of the
+marker alone is measured first and subtracted.
+
+Usage:
+    python benchmarks/shells.py [--shells bash zsh fish]
+                                [--sizes 1:10 100:1000 10000:100000]
+                                [--samples 50] [--output results.jsonl]
+                                [--baseline old.jsonl --threshold 1.2]
+                                [--minify]
+
+Sizes are given as <commands>:<options>. Results are written as one JSON
+object per line. With `--baseline`, the exit status is 1 if any p50 is
+slower than the one in the baseline by more than the threshold ratio.
+With `--minify`, the scripts are generated minified.
+"""
+import argparse
+import json
+import os
+import pty
+import select
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from os import path
+
+from common import synthetic
+
+MARK = '__COMPLETIONS_MARK__'
+# typed in two parts, so that the echo of the setup is not taken as the mark
+MARK_CMD = "printf '%s%s' __COMPLETIONS_ MARK__"
+MARK_KEY = b'\x18m'  # Ctrl-X m
+
+BASH_COMPLETION = [
+    '/usr/share/bash-completion/bash_completion',
+    '/usr/local/share/bash-completion/bash_completion',
+    '/opt/homebrew/share/bash-completion/bash_completion',
+    '/etc/bash_completion',
+]
+
+
+class Shell:
+    """An interactive shell under a pseudo-terminal"""
+    def __init__(self, argv, env=None):
+        self.pid, self.fd = pty.fork()
+        if self.pid == 0:  # pragma: no cover
+            os.execvpe(argv[0], argv, dict(os.environ, **(env or {})))
+        self.buffer = b''
+
+    def send(self, data):
+        """Type the data"""
+        os.write(self.fd, data.encode() if isinstance(data, str) else data)
+
+    def expect(self, text, timeout=60.0):
+        """Wait for the text in the output, return the time it is seen"""
+        text = text.encode()
+        deadline = time.time() + timeout
+        while text not in self.buffer:
+            ready, _, _ = select.select([self.fd], [], [],
+                                        max(deadline - time.time(), 0))
+            if not ready:
+                raise TimeoutError('%r not seen in the output' % text)
+            self.buffer += os.read(self.fd, 65536)
+        seen = time.perf_counter()
+        self.buffer = self.buffer.split(text, 1)[1]
+        return seen
+
+    def sync(self):
+        """Wait until all the typed input has been handled"""
+        self.send(MARK_KEY)
+        self.expect(MARK)
+
+    def mark_time(self, data=b''):
+        """Time from typing the data to the mark"""
+        self.sync()
+        start = time.perf_counter()
+        self.send(data + MARK_KEY)
+        return self.expect(MARK) - start
+
+    def close(self):
+        """Kill the shell"""
+        os.kill(self.pid, signal.SIGKILL)
+        os.waitpid(self.pid, 0)
+        os.close(self.fd)
+
+
+def start_bash(workdir, script):
+    """Start bash with bash-completion, the script not sourced yet"""
+    bash_completion = next(
+        (bcfile for bcfile in [os.environ.get('BASH_COMPLETION')] +
+         BASH_COMPLETION if bcfile and path.isfile(bcfile)), None)
+    if not bash_completion:
+        raise RuntimeError('bash-completion is not found, '
+                           'set BASH_COMPLETION to its main script.')
+    shell = Shell(['bash', '--norc', '--noprofile', '-i'],
+                  {'HOME': workdir, 'PS1': '$ '})
+    shell.send("source %s; bind 'set bell-style none'; "
+               "bind -x '\"\\C-xm\": %s'\n" % (bash_completion, MARK_CMD))
+    shell.sync()
+    return shell, lambda: shell.mark_time(b'source %s\n' %
+                                          script.encode())
+
+
+def start_zsh(workdir, script):
+    """Start zsh with the completion system, the script in fpath"""
+    shell = Shell(['zsh', '-f', '-i'], {'HOME': workdir, 'PS1': '$ '})
+    shell.send("unsetopt auto_list auto_menu beep; "
+               "fpath=(%s $fpath); autoload -Uz compinit; compinit -u -D; "
+               "_bench_mark() { %s }; zle -N _bench_mark; "
+               "bindkey '^Xm' _bench_mark\n" %
+               (path.dirname(script), MARK_CMD))
+    shell.sync()
+    return shell, None
+
+
+def start_fish(workdir, script):
+    """Start fish without any configuration, the script not sourced yet"""
+    shell = Shell(['fish', '-i'], {
+        'HOME': workdir,
+        'XDG_CONFIG_HOME': path.join(workdir, 'config'),
+        'XDG_DATA_HOME': path.join(workdir, 'data'),
+    })
+    shell.send("set fish_greeting; function fish_prompt; echo '$ '; end; "
+               "bind \\cxm \"%s\"\n" % MARK_CMD)
+    shell.sync()
+    return shell, lambda: shell.mark_time(b'source %s\n' %
+                                          script.encode())
+
+
+STARTERS = dict(bash=start_bash, zsh=start_zsh, fish=start_fish)
+SCRIPTS = dict(bash='prog.bash', zsh='_prog', fish='prog.fish')
+# clear the line: bash and zsh take Ctrl-C as SIGINT, which flushes the
+# input typed after it, fish takes it as a key and closes the pager as well
+RESETS = dict(bash=b'\x05\x15', zsh=b'\x05\x15', fish=b'\x03')
+
+
+def percentile(values, percent):
+    """The given percentile of the values"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def bench(shellname, ncommands, noptions, samples, minify=False):
+    """Benchmark a shell with a synthetic spec, yield the results"""
+    completions = synthetic(ncommands, noptions)
+    source = completions.generate(shellname, minify=minify)
+    lines = ['prog ', 'prog --', 'prog command%d --' % (ncommands - 1)]
+    workdir = tempfile.mkdtemp()
+    script = path.join(workdir, SCRIPTS[shellname])
+    with open(script, 'w') as fscript:
+        fscript.write(source)
+
+    result = dict(shell=shellname,
+                  commands=ncommands,
+                  options=noptions,
+                  minify=minify,
+                  script_bytes=len(source.encode()),
+                  script_lines=source.count('\n'))
+    shell, load = STARTERS[shellname](workdir, script)
+    try:
+        baseline = statistics.median(
+            shell.mark_time() for _ in range(max(samples, 10)))
+        if load:
+            yield dict(result, line=None, load_ms=(load() - baseline) * 1e3)
+        else:
+            # autoloaded with the first TAB
+            shell.send(lines[0])
+            elapsed = shell.mark_time(b'\t')
+            shell.send(RESETS[shellname])
+            yield dict(result, line=None,
+                       load_ms=(elapsed - baseline) * 1e3)
+
+        for line in lines:
+            latencies = []
+            for _ in range(samples):
+                shell.send(line)
+                latencies.append(shell.mark_time(b'\t') - baseline)
+                shell.send(RESETS[shellname])
+            yield dict(result,
+                       line=line,
+                       samples=samples,
+                       p50_ms=percentile(latencies, 50) * 1e3,
+                       p99_ms=percentile(latencies, 99) * 1e3)
+    finally:
+        shell.close()
+        shutil.rmtree(workdir)
+
+
+def regressions(results, baseline, threshold):
+    """Compare the p50 latencies with the baseline results"""
+    def key(result):
+        return (result['shell'], result['commands'], result['options'],
+                result.get('minify', False), result['line'])
+
+    before = {key(result): result for result in baseline}
+    for result in results:
+        old = before.get(key(result))
+        if not old:
+            continue
+        for field in ('p50_ms', 'load_ms'):
+            if (field in result and field in old
+                    and result[field] > old[field] * threshold):
+                yield '%s: %s %.2fms -> %.2fms' % (
+                    ' '.join(str(item) for item in key(result)), field,
+                    old[field], result[field])
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--shells', nargs='+', default=list(STARTERS))
+    parser.add_argument('--sizes', nargs='+',
+                        default=['1:10', '10:100', '100:1000', '1000:10000',
+                                 '10000:100000'])
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--output', type=argparse.FileType('w'),
+                        default=sys.stdout)
+    parser.add_argument('--baseline', type=argparse.FileType('r'))
+    parser.add_argument('--threshold', type=float, default=1.2)
+    parser.add_argument('--minify', action='store_true')
+    args = parser.parse_args()
+
+    results = []
+    for shellname in args.shells:
+        if not shutil.which(shellname):
+            sys.stderr.write('%s is not installed, skipped.\n' % shellname)
+            continue
+        for size in args.sizes:
+            ncommands, noptions = (int(num) for num in size.split(':'))
+            for result in bench(shellname, ncommands, noptions, args.samples,
+                                args.minify):
+                results.append(result)
+                args.output.write(json.dumps(result) + '\n')
+                args.output.flush()
+
+    if args.baseline:
+        slower = list(
+            regressions(results,
+                        [json.loads(line) for line in args.baseline],
+                        args.threshold))
+        for line in slower:
+            sys.stderr.write('Regression: %s\n' % line)
+        sys.exit(1 if slower else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+"""
+Peak memory and time of loading a large spec, as a whole and streamed.
+
+A synthetic spec of each size is written as a configuration file in YAML,
+and as records in NDJSON and in a YAML stream. Each of them is loaded in a
+fresh interpreter, for:
+- load_file: the YAML configuration file, parsed as a whole by
+  python-simpleconf, then loaded;
+- stream_ndjson/stream_yaml: the records loaded one at a time by
+  `load_stream()`.
+
+The peak memory is the growth of the maximum resident set size of the
+interpreter while loading, and with `--tracemalloc`, the peak of the memory
+allocated by python as well, which slows the loading down several times.
+
+Usage:
+    python benchmarks/streaming.py [--sizes 1000:10 10000:10 50000:10]
+                                   [--repeat 1] [--tracemalloc]
+                                   [--output results.jsonl]
+
+Sizes are given as <commands>:<options of each command>. Results are written
+as one JSON object per line, the best time and the lowest peak of the
+repeated runs. Parsing the configuration file as a whole takes about a
+second per thousand commands, so the sizes are kept moderate by default.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+from os import path
+
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+
+# run in a fresh interpreter, so that the peaks are of the loading only
+LOADER = """
+import json, resource, sys, time, tracemalloc
+sys.path.insert(0, %(root)r)
+from completions import Completions
+import simpleconf, yaml
+case, specfile, trace = sys.argv[1:]
+if trace == '1':
+    tracemalloc.start()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+completions = Completions()
+if case == 'load_file':
+    completions.load_file(specfile)
+else:
+    completions.load_stream(specfile)
+elapsed = time.perf_counter() - start
+growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss
+result = dict(seconds=elapsed,
+              # kilobytes on Linux, bytes on macOS
+              maxrss_growth=growth * (1 if sys.platform == 'darwin' else 1024),
+              commands=len(completions.commands))
+if trace == '1':
+    result['tracemalloc_peak'] = tracemalloc.get_traced_memory()[1]
+print(json.dumps(result))
+"""
+CASES = dict(load_file='spec.yaml',
+             stream_ndjson='spec.ndjson',
+             stream_yaml='spec.stream.yaml')
+
+
+def records(ncommands, noptions):
+    """The records of a synthetic spec"""
+    yield {
+        'program': {
+            'name': 'prog',
+            'desc': 'Synthetic program',
+            'options': {'--global%d' % i: 'Global option %d.' % i
+                        for i in range(10)},
+        },
+        'inherit': True,
+    }
+    for i in range(ncommands):
+        yield {
+            'command': 'command%d' % i,
+            'desc': 'Command %d.' % i,
+            'options': {'--option%d' % j: 'Option %d of command %d.' % (j, i)
+                        for j in range(noptions)},
+        }
+
+
+def write_specs(workdir, ncommands, noptions):
+    """Write the spec in the formats of the cases"""
+    import yaml
+    dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+    with open(path.join(workdir, CASES['stream_ndjson']), 'w') as fspec:
+        for record in records(ncommands, noptions):
+            fspec.write(json.dumps(record) + '\n')
+    with open(path.join(workdir, CASES['stream_yaml']), 'w') as fspec:
+        yaml.dump_all(records(ncommands, noptions), fspec, Dumper=dumper,
+                      explicit_start=True, sort_keys=False)
+    # the configuration file, the commands nested under `commands`
+    with open(path.join(workdir, CASES['load_file']), 'w') as fspec:
+        recs = records(ncommands, noptions)
+        yaml.dump(next(recs), fspec, Dumper=dumper, sort_keys=False)
+        fspec.write('commands:\n')
+        for record in recs:
+            name = record.pop('command')
+            fspec.write(textwrap.indent(
+                yaml.dump({name: record}, Dumper=dumper, sort_keys=False),
+                '    '))
+
+
+def run(case, specfile, tracemalloc):
+    """Load the spec in a fresh interpreter, get the result"""
+    output = subprocess.run(
+        [sys.executable, '-c', LOADER % dict(root=ROOT), case, specfile,
+         '1' if tracemalloc else '0'],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True).stdout
+    return json.loads(output)
+
+
+def bench(ncommands, noptions, repeat, tracemalloc):
+    """Benchmark the cases with a synthetic spec, yield the results"""
+    workdir = tempfile.mkdtemp()
+    try:
+        write_specs(workdir, ncommands, noptions)
+        for case, specname in CASES.items():
+            specfile = path.join(workdir, specname)
+            runs = [run(case, specfile, tracemalloc) for _ in range(repeat)]
+            result = dict(case=case,
+                          commands=ncommands,
+                          options=noptions,
+                          file_bytes=path.getsize(specfile),
+                          ms=min(item['seconds'] for item in runs) * 1e3,
+                          maxrss_growth_mb=min(
+                              item['maxrss_growth']
+                              for item in runs) / 1024.0 / 1024.0)
+            if tracemalloc:
+                result['tracemalloc_peak_mb'] = min(
+                    item['tracemalloc_peak']
+                    for item in runs) / 1024.0 / 1024.0
+            assert all(item['commands'] == ncommands for item in runs)
+            yield result
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', nargs='+',
+                        default=['1000:10', '10000:10', '50000:10'])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--tracemalloc', action='store_true')
+    parser.add_argument('--output', type=argparse.FileType('w'),
+                        default=sys.stdout)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        ncommands, noptions = (int(num) for num in size.split(':'))
+        for result in bench(ncommands, noptions, args.repeat,
+                            args.tracemalloc):
+            args.output.write(json.dumps(result) + '\n')
+            args.output.flush()
+
+
+if __name__ == '__main__':
+    main()
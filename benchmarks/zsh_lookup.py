@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Per-TAB latency of the generated zsh completion function.
+
+The completion function is called directly in a loop, with `_describe`,
+`_arguments` and `compdef` stubbed out, so that only the lookup done by the
+generated code is measured, not the rendering of the candidates by zsh.
+
+Usage:
+    python benchmarks/zsh_lookup.py [--sizes 10 100 1000 10000] [--repeat 1000]
+
+Prints one JSON object per size.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import synthetic
+
+ZSH_DRIVER = r"""
+zmodload zsh/datetime
+_describe() { :; }
+_arguments() { :; }
+compdef() { :; }
+words=(prog) CURRENT=2
+start=$EPOCHREALTIME
+source %(script)s
+load=$(( EPOCHREALTIME - start ))
+words=(prog %(command)s --) CURRENT=3
+start=$EPOCHREALTIME
+repeat %(repeat)d %(function)s
+print $load $(( (EPOCHREALTIME - start) / %(repeat)d ))
+"""
+
+
+def bench(ncommands, repeat):
+    """Time the source of the script and a TAB on the last command"""
+    completions = synthetic(ncommands)
+    source = completions.generate('zsh')
+    function = '_%s_%s_complete' % (completions.availname, completions.uid)
+    with tempfile.NamedTemporaryFile('w', suffix='.zsh') as fscript:
+        fscript.write(source)
+        fscript.flush()
+        out = subprocess.check_output(
+            ['zsh', '-f', '-c', ZSH_DRIVER % dict(
+                script=fscript.name,
+                command='command%d' % (ncommands - 1),
+                repeat=repeat,
+                function=function)],
+            universal_newlines=True)
+    load, tab = out.split()
+    return dict(shell='zsh',
+                commands=ncommands,
+                load_ms=float(load) * 1e3,
+                tab_us=float(tab) * 1e6)
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+    if not shutil.which('zsh'):
+        sys.exit('zsh is not installed.')
+    for size in args.sizes:
+        print(json.dumps(bench(size, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
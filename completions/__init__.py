@@ -1,19 +1,14 @@
 #!/usr/bin/env python
 """
 Generate completions for shells
+
+Only the modules loaded by the interpreter anyway are imported here, the
+others are imported by the functions need them, so that importing the
+package costs little for a program which completes itself.
 """
-import re
 import sys
-import uuid
 import warnings
-from os import path, sep, rename, makedirs, environ
-from simpleconf import Config
-from completions.templates import (assemble_bash_with_commands,
-                                   assemble_bash_without_commands,
-                                   assemble_fish_with_commands,
-                                   assemble_fish_without_commands,
-                                   assemble_zsh_with_commands,
-                                   assemble_zsh_without_commands)
+from os import path, sep, makedirs, environ, replace, remove, chmod, stat
 
 
 __version__ = "0.0.8"
@@ -34,30 +29,474 @@ def log(msg, *args):
     sys.stderr.write('- %s\n' % (msg % args))
 
 
+def _write_chunks(fileobj, chunks, bufsize=65536):
+    """Write the chunks of code to a file object, in blocks of bufsize"""
+    block = []
+    size = 0
+    for chunk in chunks:
+        block.append(chunk)
+        size += len(chunk)
+        if size >= bufsize:
+            fileobj.write(''.join(block))
+            block = []
+            size = 0
+    fileobj.write(''.join(block))
+
+
+class _AtomicFile: # pylint: disable=too-few-public-methods
+    """A temporary file to write, renamed to filename once closed
+
+    So that the file is never seen half-written. The real path of filename
+    is written, in case it is a symbolic link, as rc files often are.
+    """
+    def __init__(self, filename, mode='w'):
+        import tempfile
+        self.filename = path.realpath(filename)
+        fdesc, self.tmpfile = tempfile.mkstemp(
+            dir=path.dirname(self.filename),
+            prefix='.%s.' % path.basename(self.filename))
+        self.file = open(fdesc, mode)
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        try:
+            if exc_type is not None:
+                raise exc_value
+            chmod(self.tmpfile,
+                  stat(self.filename).st_mode
+                  if path.exists(self.filename) else 0o644)
+            replace(self.tmpfile, self.filename)
+        except BaseException:
+            remove(self.tmpfile)
+            raise
+
+
+def _atomic_write(filename, chunks):
+    """Write the chunks to filename atomically"""
+    with _AtomicFile(filename) as ftmp:
+        _write_chunks(ftmp, chunks)
+
+
+def _file_hash(filename):
+    """The sha256 of the content of a file"""
+    import hashlib
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as fhash:
+        for block in iter(lambda: fhash.read(65536), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _spec_cache_file(compfile):
+    """The file caching the completions loaded from a configuration file"""
+    import hashlib
+    return path.join(
+        environ.get('XDG_CACHE_HOME') or path.expanduser('~/.cache'),
+        'completions', 'specs', '%s.pickle' % hashlib.sha1(
+            path.realpath(compfile).encode()).hexdigest()[:16])
+
+
+def _load_spec_cache(compfile):
+    """Load the cached completions of a configuration file
+
+    Returns None if not cached, or the file is changed since. The file is
+    taken as not changed if its mtime and size are the same; otherwise its
+    content is hashed, so that a touch doesn't invalidate the cache.
+    """
+    import pickle
+    cachefile = _spec_cache_file(compfile)
+    try:
+        with open(cachefile, 'rb') as fcache:
+            cached = pickle.load(fcache)
+    except Exception:  # pylint: disable=broad-except
+        # not cached, or pickled by another version
+        return None
+    fstat = stat(compfile)
+    if cached.get('version') != __version__ or cached['size'] != fstat.st_size:
+        return None
+    if cached['mtime_ns'] != fstat.st_mtime_ns:
+        if cached['sha256'] != _file_hash(compfile):
+            return None
+        cached['mtime_ns'] = fstat.st_mtime_ns
+        _save_spec_cache(compfile, cached)
+    return cached['completions']
+
+
+def _save_spec_cache(compfile, cached):
+    """Save the cache of a configuration file"""
+    import pickle
+    cachefile = _spec_cache_file(compfile)
+    makedirs(path.dirname(cachefile), mode=0o700, exist_ok=True)
+    with _AtomicFile(cachefile, 'wb') as fcache:
+        pickle.dump(cached, fcache, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+INSTALLED = '.completions-installed.json'
+
+
+def _load_installed(compdir):
+    """Load the record of the files installed to a completion directory"""
+    import json
+    try:
+        with open(path.join(compdir, INSTALLED)) as finst:
+            return json.load(finst)
+    except (OSError, ValueError):
+        return {'scripts': {}}
+
+
+def _save_installed(compdir, installed):
+    """Save the record of the files installed to a completion directory"""
+    import json
+    _atomic_write(path.join(compdir, INSTALLED),
+                  [json.dumps(installed, indent=2, sort_keys=True)])
+
+
+def _install(compdir, compfile, source, installed, backfile=None):
+    """Install a completion file, unless the same one is installed already
+
+    `source` is a function returning the chunks of the code, called once to
+    hash them, and once more to write them only if the hash changes. A file
+    not installed by us, or modified since, is backed up before overwritten.
+    Returns whether the file is written.
+    """
+    import hashlib
+    import shutil
+    sha = hashlib.sha256()
+    for chunk in source():
+        sha.update(chunk.encode())
+    digest = sha.hexdigest()
+
+    name = path.relpath(compfile, compdir)
+    record = installed['scripts'].get(name)
+    try:
+        fstat = stat(compfile)
+    except FileNotFoundError:
+        fstat = None
+    ours = bool(record and fstat and record['size'] == fstat.st_size
+                and record['mtime_ns'] == fstat.st_mtime_ns)
+    if ours and record['sha256'] == digest:
+        log('Completion file is up to date: %r', compfile)
+        return False
+
+    if fstat and not ours:
+        backfile = backfile or compfile + '.completions.bak'
+        log('Completion file exists: %r', compfile)
+        log('Back it up to: %r', backfile)
+        shutil.copy2(compfile, backfile)
+    log('Writing completion code to: %r', compfile)
+    _atomic_write(compfile, source())
+    fstat = stat(compfile)
+    installed['scripts'][name] = dict(sha256=digest,
+                                      size=fstat.st_size,
+                                      mtime_ns=fstat.st_mtime_ns)
+    return True
+
+
+def _add_bash_entry_point(compdir, installed):
+    """Source the completion files in ~/.bashrc, unless done already
+
+    Returns whether the installation record is changed.
+    """
+    entryfile = path.expanduser('~/.bashrc')
+    entrybak = entryfile + '.completions.bak'
+    # the entry point is recorded once added, no need to read the rc
+    # file again for the following installations
+    if installed.get('entry') == entryfile:
+        return False
+    entry = ''
+    if path.isfile(entryfile):
+        with open(entryfile, 'r') as fentry:
+            entry = fentry.read()
+    # detect if we've already add entry point
+    entry_point = ('\n' +
+                   '### Start adding entry point by completions, '
+                   'do NOT modify ###\n' +
+                   'for bcfile in %s/*.bash-completion; do\n' %
+                   compdir + '	[ -f "$bcfile" ] && . $bcfile\n' +
+                   'done\n' +
+                   '### End adding entry point by completions ###\n')
+
+    if entry_point not in entry:
+        log('Backup entry point file: %s' % entryfile)
+        log('To: %s' % entrybak)
+        with open(entrybak, 'w') as fbak:
+            fbak.write(entry)
+        log('Add entry point')
+        _atomic_write(entryfile, [entry, entry_point])
+    installed['entry'] = entryfile
+    return True
+
+
+# compinit in the entry point, trusting the dump, which the installer
+# removes once the completion files change
+ZSH_COMPINIT = ('# the dump is trusted without checking fpath, and removed by '
+                'completions\n'
+                '# once it installs a completion file. After adding others by '
+                'yourself,\n'
+                '# run `rm -f ${ZDOTDIR:-$HOME}/.zcompdump*`.\n'
+                'compinit -C\n')
+# added by the older versions, rebuilding the dump at every start of zsh
+ZSH_COMPINIT_OLD = ('# blow may take some time to start, you may want to '
+                    'comment it out\n'
+                    '# and set up the compinit by yourself.\n'
+                    'rm -f ~/.zcompdump; compinit -C\n')
+
+
+def _zcompdump():
+    """The completion dump of zsh, where compinit writes it by default"""
+    return path.join(environ.get('ZDOTDIR') or path.expanduser('~'),
+                     '.zcompdump')
+
+
+def _remove_zcompdump():
+    """Remove the completion dumps, so that compinit builds them again
+
+    Including the ones named after the host and the version of zsh, such as
+    by oh-my-zsh, and the compiled ones.
+    """
+    import glob
+    for dumpfile in glob.glob(glob.escape(_zcompdump()) + '*'):
+        log('Removing completion dump: %r', dumpfile)
+        remove(dumpfile)
+
+
+def _zcompile(compfile):
+    """Compile a zsh completion file to the .zwc file zsh prefers to load"""
+    import subprocess
+    log('Compiling completion file to: %r', compfile + '.zwc')
+    try:
+        subprocess.run(['zsh', '-fc', 'zcompile -Uz "$1"', 'zsh', compfile],
+                       check=True)
+    except (OSError, subprocess.CalledProcessError) as exc:
+        log('Failed to compile, the source is loaded instead: %s', exc)
+
+
+def _add_zsh_entry_point(compdir, installed):
+    """Add the completion files to fpath in ~/.zshrc, unless done already
+
+    compinit is added as well if not there. Returns whether the installation
+    record is changed.
+    """
+    entryfile = path.expanduser('~/.zshrc')
+    entrybak = entryfile + '.completions.bak'
+    # the entry point is recorded once added, no need to read the rc
+    # file again for the following installations
+    if (installed.get('entry') == entryfile
+            and installed.get('zcompdump') == _zcompdump()):
+        return False
+    entry = ''
+    if path.isfile(entryfile):
+        with open(entryfile, 'r') as fentry:
+            entry = fentry.read()
+    # detect if we've already add entry point
+    if 'compinit' in entry:
+        entry_point = (
+            '\n' +
+            '### Start adding entry point by completions, '
+            'do NOT modify ###\n' +
+            'fpath+=%s\n' % compdir +
+            '### End adding entry point by completions ###\n'
+        )
+    else:
+        log('compinstall not found in %s' % entryfile)
+        log('Add it (to disable: add `#compinit`).')
+        entry_point = (
+            '\n' +
+            '### Start adding entry point by completions ###\n' +
+            'zstyle :compinstall filename %r\n' % entryfile +
+            'autoload -Uz compinit\n' +
+            'fpath+=%s\n' % compdir + ZSH_COMPINIT +
+            '### End adding entry point by completions ###\n'
+        )
+
+    if ZSH_COMPINIT_OLD in entry:
+        log('Keep the completion dump in entry point: %s' % entryfile)
+        _atomic_write(entryfile,
+                      [entry.replace(ZSH_COMPINIT_OLD, ZSH_COMPINIT)])
+    elif '# Start adding entry point by completions' not in entry:
+        log('Backup entry point file: %s' % entryfile)
+        log('To: %s' % entrybak)
+        with open(entrybak, 'w') as fbak:
+            fbak.write(entry)
+        log('Add entry point')
+
+        # fpath is to be extended before compinit is called
+        compinit_index = None
+        entrylines = entry.splitlines(True)
+        for i, line in enumerate(entrylines):
+            if 'compinit' in line and not line.lstrip().startswith('#'):
+                compinit_index = i
+        if compinit_index is None:
+            entry += entry_point
+        else:
+            entrylines.insert(compinit_index, entry_point[1:] + '\n')
+            entry = ''.join(entrylines)
+        _atomic_write(entryfile, [entry])
+    installed['entry'] = entryfile
+    installed['zcompdump'] = _zcompdump()
+    return True
+
+
+_NAMESPACE_DNS = bytes.fromhex('6ba7b8109dad11d180b400c04fd430c8')
+
+
+def _uid(name):
+    """The unique id of a program, used in the names of the functions
+
+    The last group of `uuid.uuid3(uuid.NAMESPACE_DNS, name)`, of which the
+    bytes are from the md5 as they are, without importing uuid.
+    """
+    import hashlib
+    return hashlib.md5(_NAMESPACE_DNS + name.encode()).hexdigest()[-12:]
+
+
+class _NoProfile:
+    """Stands for a profile when not profiling, see `completions.profiling`"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def phase(self, name): # pylint: disable=unused-argument
+        """Nothing recorded"""
+        return self
+
+    @staticmethod
+    def chunks(name, chunks): # pylint: disable=unused-argument
+        """The chunks as they are"""
+        return chunks
+
+
+_NO_PROFILE = _NoProfile()
+
+
+def _detect_shell():
+    """Detect the shell from `$SHELL`"""
+    import re
+    return re.sub(r'[^\w].*', '', path.basename(environ['SHELL']))
+
+
 class CompletionsLoadError(Exception):
     """Raises while failed to load completions from configuration file"""
 
 
-class Command: # pylint: disable=too-few-public-methods
-    """A command"""
-    def __init__(self, name, desc, options=None):
+class Provider: # pylint: disable=too-few-public-methods
+    """A shell command providing the values of an option.
+
+    The output, one value per line, is cached per user for `ttl` seconds.
+    A completion request waits no longer than `timeout` seconds for a
+    refresh, which goes on in background if it takes longer.
+
+    The command can also be `python:package.module:function`, returning the
+    values, which is called in-process by the completions daemon.
+
+    With `index`, for vocabularies too large to be loaded by the shell on
+    each TAB, the values are cached sorted, and those starting with the word
+    being completed are found by a binary search, with `look`.
+    """
+    __slots__ = ('command', 'ttl', 'timeout', 'index')
+
+    def __init__(self, command, ttl=3600, timeout=1.0, index=False):
+        self.command = command
+        self.ttl = int(ttl)
+        self.timeout = float(timeout)
+        self.index = bool(index)
+
+    @property
+    def ident(self):
+        """What makes the values of a provider, shared by the options"""
+        return (self.command, self.ttl, self.timeout, self.index)
+
+    @property
+    def key(self):
+        """The name of the cache file, the index is kept next to it"""
+        import hashlib
+        return hashlib.sha1(('index:' if self.index else '').encode() +
+                            self.command.encode()).hexdigest()[:16]
+
+    @property
+    def shell(self):
+        """The shell command to run, when the daemon is not running"""
+        from shlex import quote
+        if not self.command.startswith('python:'):
+            return self.command
+        modname, funcname = self.command[7:].split(':', 1)
+        return '%s -c %s' % (quote(sys.executable), quote(
+            'from %s import %s; print(*%s(), sep="\\n")' %
+            (modname, funcname, funcname)))
+
+
+class Command:
+    """A command, which may have its own subcommands
+
+    Only its own options are kept, the global ones inherited are looked up
+    through `Completions.options_of()`, instead of copied to each command.
+    """
+    __slots__ = ('name', 'desc', 'options', 'providers', 'commands')
+
+    def __init__(self, name, desc, options=None, commands=None):
         self.name = name
         self.desc = desc
-        self.options = options or {}
+        self.options = {}
+        self.providers = {}
+        self.commands = commands or {}
+        for key, val in (options or {}).items():
+            self.add_option(key, val)
 
-    def add_option(self, opt, desc):
+    def add_option(self, # pylint:disable=too-many-arguments
+                   opt,
+                   desc,
+                   provider=None,
+                   ttl=3600,
+                   timeout=1.0,
+                   index=False):
         """
         Add option to a command
+        If provider, a shell command, is given, the values of the option are
+        completed with its output.
         """
-        if isinstance(opt, list):
-            for option in opt:
-                self.options[option] = desc
-        else:
-            self.options[opt] = desc
+        if isinstance(desc, dict):
+            provider = desc.get('provider', provider)
+            ttl = desc.get('ttl', ttl)
+            timeout = desc.get('timeout', timeout)
+            index = desc.get('index', index)
+            desc = desc.get('desc') or ''
+        if not isinstance(opt, list):
+            opt = [opt]
+        for option in opt:
+            self.options[option] = desc
+            if provider:
+                self.providers[option] = Provider(provider, ttl, timeout,
+                                                  index)
+
+    def add_command(self, name, desc, options=None):
+        """Add a subcommand to the command"""
+        self.commands[name] = Command(name, desc, options)
+        return self.commands[name]
+
+    def command(self, name):
+        """Get the subcommand object by given name"""
+        return self.commands[name]
+
+    def load_commands(self, commands):
+        """Load subcommands, and their subcommands, from a dict"""
+        for key, val in commands.items():
+            if not isinstance(val, dict):
+                val = {'desc': val}
+            command = self.add_command(name=key,
+                                       desc=val.get('desc') or '',
+                                       options=val.get('options', {}))
+            command.load_commands(val.get('commands', {}))
 
 
 class Completions(Command):
     """Completions class"""
+    __slots__ = ('inherit', 'uid', 'fullpath')
+
     def __init__(self, # pylint:disable=too-many-arguments
                  name=None,
                  desc=None,
@@ -67,8 +506,6 @@ class Completions(Command):
         super(Completions, self).__init__(name, desc, options)
         self.name = name or sys.argv[0]
         self.desc = desc or ''
-        self.inherit = True
-        self.commands = {}
         self.inherit = inherit
         self.uid = None
         self.fullpath = fullpath and path.realpath(fullpath)
@@ -80,71 +517,54 @@ class Completions(Command):
     @property
     def availname(self):
         """Make an available for function name"""
+        import re
         return re.sub(r'[^\w_]+', '_', path.basename(self.name))
 
-    def add_command(self, name, desc, options=None):
-        """Add a command to the completions"""
-        self.commands[name] = Command(name, desc, options)
-
-    def command(self, name):
-        """Get the command object by given name"""
-        return self.commands[name]
-
     def _automate_fish(self, source):
         compfile = path.expanduser('~/.config/fish/completions/%s.fish' %
                                    self.name)
-        backfile = compfile + '.completions.bak'
-        if path.isfile(compfile):
-            log('Completion file exists: %r', compfile)
-            log('Back it up to: %r', backfile)
-            rename(compfile, backfile)
-        log('Writing completion code to: %r', compfile)
-        with open(compfile, 'w') as fcomp:
-            fcomp.write(source)
-        log('Done, you may need to restart your shell '
-            'in order for the changes to take effect.')
-
-    def _automate_bash(self, source):
+        compdir = path.dirname(compfile)
+        if not path.isdir(compdir):
+            log('User completion directory does not exist.')
+            log('Try to create it: %s' % compdir)
+            makedirs(compdir)
+        installed = _load_installed(compdir)
+        if _install(compdir, compfile, source, installed):
+            _save_installed(compdir, installed)
+            log('Done, you may need to restart your shell '
+                'in order for the changes to take effect.')
+
+    def _automate_bash(self, source, lazy=False, minify=False):
         compfile = path.expanduser('~/.bash_completion.d/%s.bash-completion' %
                                    self.name)
         compdir = path.dirname(compfile)
-        backfile = compfile + '.completions.bak'
         if not path.isdir(compdir):
             log('User completion directory does not exist.')
             log('Try to create it: %s' % compdir)
             makedirs(compdir)
-        entryfile = path.expanduser('~/.bashrc')
-        entrybak = entryfile + '.completions.bak'
-        with open(entryfile, 'r') as fentry:
-            entry = fentry.read()
-        # detect if we've already add entry point
-        entry_point = ('\n' +
-                       '### Start adding entry point by completions, '
-                       'do NOT modify ###\n' +
-                       'for bcfile in %s/*.bash-completion; do\n' % compdir +
-                       '	[ -f "$bcfile" ] && . $bcfile\n' +
-                       'done\n' +
-                       '### End adding entry point by completions ###\n')
-
-        if entry_point not in entry:
-            log('Backup entry point file: %s' % entryfile)
-            log('To: %s' % entrybak)
-            with open(entryfile, 'a+') as fentry, open(entrybak, 'w') as fbak:
-                fbak.write(fentry.read())
-                log('Add entry point')
-                fentry.write(entry_point)
-
-        if path.isfile(compfile):
-            log('Completion file exists: %r', compfile)
-            log('Back it up to: %r', backfile)
-            rename(compfile, backfile)
-        log('Writing completion code to: %r', compfile)
-        with open(compfile, 'w') as fcomp:
-            fcomp.write(source)
-        log('Done, you may need to restart your shell '
-            'in order for the changes to take effect.')
-
-    def _automate_zsh(self, source): # pylint:disable=too-many-locals
+        installed = _load_installed(compdir)
+        changed = _add_bash_entry_point(compdir, installed)
+
+        if lazy:
+            # the full script is not sourced by the entry point, but by the
+            # stub on the first TAB
+            fullfile = path.join(compdir, 'full', '%s.bash' % self.name)
+            if not path.isdir(path.dirname(fullfile)):
+                makedirs(path.dirname(fullfile))
+            changed = _install(compdir, fullfile, source, installed) or changed
+            stub = self.stub('bash', fullfile, minify)
+
+            def stub_source():
+                return [stub]
+            source = stub_source
+
+        changed = _install(compdir, compfile, source, installed) or changed
+        if changed:
+            _save_installed(compdir, installed)
+            log('Done, you may need to restart your shell '
+                'in order for the changes to take effect.')
+
+    def _automate_zsh(self, source, zcompile=False):
         compfile = path.expanduser('~/.zsh-completions/_%s' % self.name)
         compdir = path.dirname(compfile)
         backfile = path.expanduser('~/.zsh-completions/.%s.completions.bak' %
@@ -153,128 +573,170 @@ class Completions(Command):
             log('User completion directory does not exist.')
             log('Try to create it: %s' % compdir)
             makedirs(compdir, mode=0o755)
-        entryfile = path.expanduser('~/.zshrc')
-        entrybak = entryfile + '.completions.bak'
-        with open(entryfile, 'r') as fentry:
-            entry = fentry.read()
-        # detect if we've already add entry point
-
-        if 'compinit' in entry:
-            entry_point = (
-                '\n' +
-                '### Start adding entry point by completions, '
-                'do NOT modify ###\n' +
-                'fpath+=%s\n' % compdir +
-                '### End adding entry point by completions ###\n'
-            )
-        else:
-            log('compinstall not found in %s' % entryfile)
-            log('Add it (to disable: add `#cominit`).')
-            entry_point = (
-                '\n' +
-                '### Start adding entry point by completions ###\n' +
-                'zstyle :compinstall filename %r\n' % entryfile +
-                'autoload -Uz compinit\n' +
-                'fpath+=%s\n' % compdir +
-                '# blow may take some time to start, '
-                'you may want to comment it out\n' +
-                '# and set up the compinit by yourself.\n' +
-                'rm -f ~/.zcompdump; compinit -C\n' +
-                '### End adding entry point by completions ###\n'
-            )
-
-        if '# Start adding entry point by completions' not in entry:
-            log('Backup entry point file: %s' % entryfile)
-            log('To: %s' % entrybak)
-            with open(entryfile, 'r') as fentry, open(entrybak, 'w') as fbak:
-                entrysrc = fentry.read()
-                fbak.write(entrysrc)
-            log('Add entry point')
-
-            compinit_index = None
-            entrylines = entrysrc.splitlines()
-            for i, line in enumerate(reversed(entrylines)):
-                if 'cominit' in line and not line.startswith('#'):
-                    compinit_index = i
-                    break
-            if compinit_index is None:
-                entrysrc += entry_point
-            else:
-                entrylines.insert(compinit_index, entry_point)
-                entrysrc = '\n'.join(entrylines)
-            with open(entryfile, 'w') as fentry:
-                fentry.write(entrysrc)
-
-        if path.isfile(compfile):
-            log('Completion file exists: %r', compfile)
-            log('Back it up to: %r', backfile)
-            rename(compfile, backfile)
-        log('Writing completion code to: %r', compfile)
-        with open(compfile, 'w') as fcomp:
-            fcomp.write(source)
-        log('Done, you may need to restart your shell '
-            'in order for the changes to take effect.')
-
-    def _generate_bash(self):
+        installed = _load_installed(compdir)
+        changed = _add_zsh_entry_point(compdir, installed)
+
+        zwcfile = compfile + '.zwc'
+        if _install(compdir, compfile, source, installed, backfile):
+            changed = True
+            # the dump maps the programs to their completion functions,
+            # and is trusted by `compinit -C`
+            _remove_zcompdump()
+            if path.exists(zwcfile):
+                remove(zwcfile)
+        if zcompile and not path.exists(zwcfile):
+            _zcompile(compfile)
+        if changed:
+            _save_installed(compdir, installed)
+            log('Done, you may need to restart your shell '
+                'in order for the changes to take effect.')
+
+    def _function(self, minify=False):
+        """The name of the function completing
+
+        Minified, only the unique id, the names derived from it are
+        shortened as well.
+        """
+        if minify:
+            return '_' + self.uid
+        return '_%s_%s_complete' % (self.availname, self.uid)
+
+    def _generate_bash(self, minify=False):
+        from completions.templates.bash import (
+            assemble_bash_with_commands, assemble_bash_without_commands)
         if self.commands:
             return assemble_bash_with_commands(
-                self.name, '_%s_%s_complete' % (self.availname, self.uid),
-                self.options, self.commands, self.fullpath)
+                self.name, self._function(minify), self.options,
+                self.commands, self.fullpath, self.providers, self.inherit,
+                minify)
         return assemble_bash_without_commands(
-            self.name, '_%s_%s_complete' % (self.availname, self.uid),
-            self.options, self.fullpath)
+            self.name, self._function(minify), self.options, self.fullpath,
+            self.providers, minify)
 
-    def _generate_fish(self):
+    def _generate_fish(self, minify=False):
+        from completions.templates.fish import (
+            assemble_fish_with_commands, assemble_fish_without_commands)
         if self.commands:
             return assemble_fish_with_commands(
-                self.name, '_%s_%s_complete' % (self.availname, self.uid),
-                self.options, self.commands, self.fullpath)
+                self.name, self._function(minify), self.options,
+                self.commands, self.fullpath, self.providers, self.inherit,
+                minify)
         return assemble_fish_without_commands(
-            self.name, '_%s_%s_complete' % (self.availname, self.uid),
-            self.options, self.fullpath)
+            self.name, self._function(minify), self.options, self.fullpath,
+            self.providers, minify)
 
-    def _generate_zsh(self):
+    def _generate_zsh(self, minify=False):
+        from completions.templates.zsh import (
+            assemble_zsh_with_commands, assemble_zsh_without_commands)
         if self.commands:
             return assemble_zsh_with_commands(
-                self.name, '_%s_%s_complete' % (self.availname, self.uid),
-                self.options, self.commands, self.fullpath)
+                self.name, self._function(minify), self.options,
+                self.commands, self.fullpath, self.providers, self.inherit,
+                minify)
         return assemble_zsh_without_commands(
-            self.name, '_%s_%s_complete' % (self.availname, self.uid),
-            self.options, self.fullpath)
+            self.name, self._function(minify), self.options, self.fullpath,
+            self.providers, minify)
 
-    def _inherit(self):
-        if not self.inherit:
-            return
-        for _, command in self.commands.items():
-            command.options.update(self.options)
+    def options_of(self, command):
+        """The options of a command, with the global ones if inherited
 
-    def generate(self, shell, auto=False):
-        """Generate the completion code"""
-        self.uid = str(uuid.uuid3(uuid.NAMESPACE_DNS,
-                                  self.name)).split('-')[-1]
-        if shell == 'auto':
-            shell = re.sub(r'[^\w].*', '', path.basename(environ['SHELL']))
-            return self.generate(shell, auto)
-        self._inherit()
+        A view over the options of the command and the global ones, the
+        former taking precedence, without copying either.
+        """
+        if not self.inherit or command is self:
+            return command.options
+        from collections import ChainMap
+        return ChainMap(command.options, self.options)
+
+    def providers_of(self, command):
+        """The providers of the options of a command, the same way"""
+        if not self.inherit or command is self:
+            return command.providers
+        from collections import ChainMap
+        return ChainMap(command.providers, self.providers)
+
+    def stub(self, shell, script, minify=False):
+        """Generate a stub that loads the full script on the first TAB
+
+        Only for bash, since zsh and fish already autoload the completion
+        files from their directories, which is what the installers write.
+        `minify` is to be the same as the full script was generated with.
+        """
+        if shell != 'bash':
+            raise ValueError('Stubs are only needed for bash, zsh and fish '
+                             'autoload completion files.')
+        from completions.templates.bash import assemble_bash_stub
+        self.uid = _uid(self.name)
+        return assemble_bash_stub(self.name, self._function(minify), script,
+                                  self.fullpath, minify)
+
+    def _chunks(self, shell, profile=_NO_PROFILE, minify=False):
+        """The chunks of the completion code for the shell"""
+        self.uid = _uid(self.name)
         if shell == 'fish':
-            source = self._generate_fish()
-            if not auto:
-                return source
-            self._automate_fish(source)
+            chunks = self._generate_fish(minify)
         elif shell == 'bash':
-            source = self._generate_bash()
-            if not auto:
-                return source
-            self._automate_bash(source)
+            chunks = self._generate_bash(minify)
         elif shell == 'zsh':
-            source = self._generate_zsh()
-            if not auto:
-                return source
-            self._automate_zsh(source)
+            chunks = self._generate_zsh(minify)
         else:
             raise ValueError('Currently only bash, fish and zsh supported.')
+        return profile.chunks(
+            'assemble_%s_%s_commands' %
+            (shell, 'with' if self.commands else 'without'), chunks)
+
+    def generate(self, # pylint: disable=too-many-arguments
+                 shell, auto=False, lazy=False, profile=None, zcompile=False,
+                 minify=False):
+        """Generate the completion code
+
+        With `lazy`, the bash installer writes a stub to be sourced by the
+        shell, which loads the full script on the first TAB. With `zcompile`,
+        the zsh installer compiles the completion file to a `.zwc` file. With
+        `minify`, the code is generated without the indentation and the
+        comments, with shorter names, and for zsh and fish, with each
+        description stored once. The phases are recorded to `profile`, see
+        `completions.profiling`.
+        """
+        if shell == 'auto':
+            shell = _detect_shell()
+            return self.generate(shell, auto, lazy, profile, zcompile, minify)
+        if lazy and not auto:
+            raise ValueError('Lazy loading only works with auto, use stub() '
+                             'to generate a stub for a script elsewhere.')
+        if zcompile and not auto:
+            raise ValueError('Compiling only works with auto, run `zcompile` '
+                             'for a script elsewhere.')
+        profile = profile or _NO_PROFILE
+        if not auto:
+            return ''.join(self._chunks(shell, profile, minify))
+        # the installers generate the code again only if it is to be written
+        from functools import partial
+        source = partial(self._chunks, shell, profile, minify)
+        with profile.phase('install'):
+            if shell == 'fish':
+                self._automate_fish(source)
+            elif shell == 'bash':
+                self._automate_bash(source, lazy, minify)
+            elif shell == 'zsh':
+                self._automate_zsh(source, zcompile)
+            else:
+                raise ValueError('Currently only bash, fish and zsh supported.')
         return None
 
+    def generate_to(self, fileobj, shell, profile=None, minify=False):
+        """Write the completion code to a file object
+
+        The code is written as it is assembled, without the whole of it in
+        memory, so that it costs about the same for a spec of any size. See
+        `generate()` for `minify`.
+        """
+        if shell == 'auto':
+            shell = _detect_shell()
+        profile = profile or _NO_PROFILE
+        with profile.phase('write'):
+            _write_chunks(fileobj, self._chunks(shell, profile, minify))
+
     def load(self, dict_var):
         """Load commands and options from a dict"""
         # integrity check
@@ -295,82 +757,199 @@ class Completions(Command):
             self.add_option(key, val)
 
         self.inherit = dict_var.get('inherit', True)
-        commands = dict_var.get('commands', '')
-        for key, val in commands.items():
-            if not isinstance(val, dict):
-                val = {'desc': val}
-            options = val.get('options', {})
-            self.add_command(name=key,
-                             desc=val.get('desc') or '',
-                             options=options)
+        self.load_commands(dict_var.get('commands', {}))
+
+    def load_records(self, records):
+        """Load commands and options from records, one at a time
+
+        The records are of the schema of `completions.stream`. A command is
+        added to the one of its parent path, loaded before it. A command
+        given again is updated with the options and the commands of the
+        record, and its desc if given, so that a command with many options
+        can be split over records as well.
+        """
+        named = False
+        for record in records:
+            if not isinstance(record, dict):
+                raise CompletionsLoadError('A record should be a mapping, '
+                                           'not %r.' % (record, ))
+            if 'command' in record:
+                self._load_command_record(record)
+                continue
+            program = record.get('program') or {}
+            if 'name' in program:
+                named = True
+                self.name = program['name']
+                if sep in self.name:
+                    self.fullpath = path.realpath(self.name)
+                    self.name = path.basename(self.name)
+            if 'desc' in program:
+                self.desc = program['desc']
+            for key, val in program.get('options', {}).items():
+                self.add_option(key, val)
+            if 'inherit' in record:
+                self.inherit = record['inherit']
+            self.load_commands(record.get('commands') or {})
+        if not named:
+            raise CompletionsLoadError(
+                "A program name should be given by 'program.name'")
+
+    def _load_command_record(self, record):
+        """Load a record of a command, given by its path"""
+        compath = str(record['command']).split()
+        if not compath:
+            raise CompletionsLoadError('A command record without a path.')
+        parent = self
+        for word in compath[:-1]:
+            if word not in parent.commands:
+                raise CompletionsLoadError(
+                    'The parent of command %r should be loaded before it.' %
+                    record['command'])
+            parent = parent.commands[word]
+        command = parent.commands.get(compath[-1])
+        if command is None:
+            command = parent.add_command(compath[-1],
+                                         record.get('desc') or '',
+                                         record.get('options') or {})
+        else:
+            if record.get('desc'):
+                command.desc = record['desc']
+            for key, val in (record.get('options') or {}).items():
+                command.add_option(key, val)
+        command.load_commands(record.get('commands') or {})
+
+    def load_stream(self, compfile, profile=None):
+        """Load commands and options from a file of records, one at a time
+
+        For the specs too large to be loaded as a whole, in NDJSON or a YAML
+        stream, see `completions.stream`. Only a record is in memory at a
+        time, besides the completions loaded. The phases are recorded to
+        `profile`, see `completions.profiling`.
+        """
+        from completions.stream import read_records
+        profile = profile or _NO_PROFILE
+        with profile.phase('stream'):
+            with open(compfile) as fstream:
+                self.load_records(read_records(fstream, compfile))
+
+    def load_file(self, compfile, cache=False, profile=None):
+        """Load commands and options from a configuration file
+
+        With `cache`, the loaded completions are pickled to
+        `${XDG_CACHE_HOME:-~/.cache}/completions/specs/`, and loaded from
+        there instead of parsing the file again, until it is changed. Then
+        only the commands changed in a YAML file are parsed again, see
+        `completions.fragments`. The streams of records (NDJSON, or YAML
+        starting with `---`) are loaded by `load_stream()`. The phases are
+        recorded to `profile`, see `completions.profiling`.
+        """
+        from completions.stream import is_stream
+        profile = profile or _NO_PROFILE
+        if not cache:
+            if is_stream(compfile):
+                self.load_stream(compfile, profile)
+                return
+            with profile.phase('parse'):
+                from simpleconf import Config
+                config = Config(with_profile=False)
+                config._load(compfile)
+            with profile.phase('load'):
+                self.load(config)
+            return
 
-    def load_file(self, compfile):
-        """Load commands and options from a configuration file"""
-        config = Config(with_profile=False)
-        config._load(compfile)
-        self.load(config)
+        with profile.phase('cache'):
+            loaded = _load_spec_cache(compfile)
+        if loaded is None:
+            fstat = stat(compfile)
+            loaded = Completions()
+            if (compfile.endswith(('.yaml', '.yml'))
+                    and not is_stream(compfile)):
+                # only the commands changed since are parsed again
+                from completions.fragments import load_yaml
+                fragfile = _spec_cache_file(compfile)[:-7] + '.fragments'
+                makedirs(path.dirname(fragfile), mode=0o700, exist_ok=True)
+                with profile.phase('parse'):
+                    config = load_yaml(compfile, fragfile)
+                with profile.phase('load'):
+                    loaded.load(config)
+            else:
+                loaded.load_file(compfile, profile=profile)
+            with profile.phase('cache write'):
+                digest = _file_hash(compfile)
+                _save_spec_cache(
+                    compfile,
+                    dict(version=__version__,
+                         size=fstat.st_size,
+                         mtime_ns=fstat.st_mtime_ns,
+                         sha256=digest,
+                         completions=loaded))
+        # the same as load() does
+        self.name = loaded.name
+        self.desc = loaded.desc
+        self.fullpath = loaded.fullpath or self.fullpath
+        self.inherit = loaded.inherit
+        self.options.update(loaded.options)
+        self.providers.update(loaded.providers)
+        self.commands.update(loaded.commands)
+
+    @classmethod
+    def from_source(cls, srcfile, name=None, profile=None):
+        """Load commands and options from the source of a python program
+
+        The argparse parsers or click commands are extracted from the source
+        without running or importing anything of it. See `completions.source`.
+        """
+        profile = profile or _NO_PROFILE
+        with profile.phase('parse'):
+            from completions.source import spec_from_source
+            spec = spec_from_source(srcfile, name)
+        completions = cls()
+        with profile.phase('load'):
+            completions.load(spec)
+        return completions
+
+
+def _bundle_chunks(completions, shell, profile=_NO_PROFILE):
+    """The chunks of the completion code of many programs in one file"""
+    if shell == 'auto':
+        shell = _detect_shell()
+    if shell != 'bash':
+        raise ValueError('Bundles are only for bash, zsh and fish autoload '
+                         'completion files for each program.')
+    names = [comp.name for comp in completions]
+    duplicated = sorted(set(name for name in names if names.count(name) > 1))
+    if duplicated:
+        raise ValueError('Programs with the same name cannot be bundled: %s' %
+                         ', '.join(duplicated))
+    from completions.templates.bash import assemble_bash_bundle
+    return profile.chunks(
+        'assemble_bash_bundle',
+        assemble_bash_bundle((comp.name, comp.options, comp.commands,
+                              comp.fullpath, comp.providers, comp.inherit)
+                             for comp in completions))
+
+
+def generate_bundle(completions, shell='bash'):
+    """Generate the completion code of many programs as one file
+
+    The code completing and serving option values is shared by the programs,
+    each of them only adds its tables, so that the shell parses the code once
+    instead of once for each program.
+    """
+    return ''.join(_bundle_chunks(completions, shell))
+
+
+def generate_bundle_to(fileobj, completions, shell='bash', profile=None):
+    """Write the completion code of many programs to a file object"""
+    profile = profile or _NO_PROFILE
+    with profile.phase('write'):
+        _write_chunks(fileobj, _bundle_chunks(completions, shell, profile))
 
 
 def main():
     """Entry point of the script"""
-    from pyparam import commands
-    commands._desc = 'Shell completions for your program made easy.'
-    commands._.shell = 'auto'
-    commands._.shell.desc = [
-        'The shell, one of bash, fish, zsh and auto.',
-        'Shell will be detected from `os.environ["SHELL"]` if auto.',
-    ]
-    commands._.auto = False
-    commands._.auto.desc = [
-        'Automatically write completions to destination file.',
-        'Bash: `~/bash_completion.d/<name>.bash-completion`',
-        '  Also try to source it in ~/.bash_completion',
-        'Fish: `~/.config/fish/completions/<name>.fish`',
-        'Zsh:  `~/.zsh-completions/_<name>`',
-        '  `fpath+=~/.zsh-completions` is ensured to add before `compinit`'
-    ]
-    commands._.a = commands._.auto
-    commands._.s = commands._.shell
-    commands.self = 'Generate completions for myself.'
-    commands.self._hbald = False
-    commands.generate = 'Generate completions from configuration files'
-    commands.generate.config.desc = [  # pylint: disable=no-member
-        'The configuration file. Scheme should be aligned following schema:',
-        '```yaml', 'program:',
-        '    name: completions',
-        '    desc: Shell completions for your program made easy.',
-        '    path: /absolute/path/to/completions',
-        '    inherit: true',
-        '    options:',
-        '        -s: The shell, one of bash, fish, zsh and auto.',
-        '        --shell: The shell, one of bash, fish, zsh and auto.',
-        '        -a: Automatically write completions to destination file.',
-        '        --auto: Automatically write completions to destination file.',
-        'commands:',
-        '    self: Generate completions for myself.',
-        '    generate:',
-        '        desc: Generate completions from configuration files.',
-        '        options:',
-        '            -c: The configuration file to load.',
-        '            --config: The configuration file to load.',
-        '```',
-        'Configuration file should be supported by `python-simpleconf`.'
-    ]
-    commands.generate.config.required = True  # pylint: disable=no-member
-    commands.generate.c = commands.generate.config  # pylint: disable=no-member
-    command, options, goptions = commands._parse()
-
-    auto = goptions['auto']
-    if command == 'self':
-        source = commands._complete(goptions['shell'], auto=auto)
-        if not auto:
-            print(source)
-    else:
-        completions = Completions()
-        completions.load_file(options['config'])
-        source = completions.generate(goptions['shell'], auto=auto)
-        if not auto:
-            print(source)
+    from completions.cli import main as cli_main
+    cli_main()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,175 @@
+"""
+Generate completions for many configuration files at once
+
+The configuration files are spread over a pool of processes, each of them
+generating the scripts for all the shells requested. A manifest keeps the
+hashes of the configuration files, so that the ones not changed since the
+last run are skipped.
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from os import path
+
+from completions import Completions, __version__, _AtomicFile, log
+
+# formats supported by python-simpleconf, and the streams of records,
+# picked up from directories
+CONFIG_EXTS = ('.yaml', '.yml', '.json', '.toml', '.ndjson', '.jsonl')
+# the names the installers give to the completion files
+OUTPUT_NAMES = dict(bash='%s.bash-completion', fish='%s.fish', zsh='_%s')
+MANIFEST = '.completions-manifest.json'
+
+
+def find_configs(configs):
+    """Expand the directories to the configuration files in them"""
+    for config in configs:
+        if not path.isdir(config):
+            yield path.abspath(config)
+            continue
+        for fname in sorted(os.listdir(config)):
+            if fname.endswith(CONFIG_EXTS):
+                yield path.abspath(path.join(config, fname))
+
+
+def config_hash(config, shells):
+    """The hash of a configuration file
+
+    The version of completions and the shells are hashed as well, so that
+    the scripts are generated again if either changes.
+    """
+    sha = hashlib.sha256()
+    sha.update(('%s %s\n' % (__version__, ' '.join(sorted(shells)))).encode())
+    with open(config, 'rb') as fconf:
+        for block in iter(lambda: fconf.read(65536), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def load_config(config, cache=False, profile=None):
+    """Load the completions from a configuration file
+
+    A python file is read as the source of the program.
+    """
+    if config.endswith('.py'):
+        return Completions.from_source(config, profile=profile)
+    completions = Completions()
+    completions.load_file(config, cache=cache, profile=profile)
+    return completions
+
+
+def generate_config(config, shells, outdir):
+    """Generate the scripts for a configuration file
+
+    They are written to `<outdir>/<shell>/`, named the same way as the
+    installers do. Returns the paths of the scripts.
+    """
+    completions = load_config(config)
+    outputs = []
+    for shell in shells:
+        outfile = path.join(outdir, shell, OUTPUT_NAMES[shell] %
+                            completions.name)
+        os.makedirs(path.dirname(outfile), exist_ok=True)
+        # never half-written, to be skipped as unchanged by the next run
+        with _AtomicFile(outfile) as fout:
+            completions.generate_to(fout, shell)
+        outputs.append(outfile)
+    return outputs
+
+
+def load_manifest(manifest):
+    """Load the manifest, empty if not existing or broken"""
+    try:
+        with open(manifest) as fman:
+            return json.load(fman)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, entries):
+    """Save the manifest, replacing the old one at once"""
+    with _AtomicFile(manifest) as fman:
+        json.dump(entries, fman, indent=2, sort_keys=True)
+
+
+def batch(configs, # pylint: disable=too-many-arguments,too-many-locals
+          shells,
+          outdir,
+          jobs=None,
+          manifest=None,
+          force=False):
+    """Generate the scripts for the configuration files and the shells
+
+    `configs` can have directories, of which the configuration files are
+    used. Unless `force`, the configuration files not changed since the
+    last run are skipped. Returns the numbers of the configuration files
+    generated, skipped and failed.
+    """
+    for shell in shells:
+        if shell not in OUTPUT_NAMES:
+            raise ValueError('Currently only bash, fish and zsh supported.')
+    outdir = path.abspath(outdir)
+    manifest = manifest or path.join(outdir, MANIFEST)
+    entries = load_manifest(manifest)
+    todo, skipped = _changed(configs, shells, entries, force)
+
+    failed = 0
+    pool = None
+    if len(todo) < 2 or jobs == 1:
+        # not worth starting a pool
+        results = ((config, _call(generate_config, config, shells, outdir))
+                   for config in todo)
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        futures = {
+            config: pool.submit(generate_config, config, shells, outdir)
+            for config in todo
+        }
+        results = ((config, _call(future.result))
+                   for config, future in futures.items())
+    try:
+        for config, (outputs, error) in results:
+            if error:
+                log('Failed to generate for %r: %s', config, error)
+                failed += 1
+                entries.pop(config, None)
+                continue
+            log('Generated for %r', config)
+            for other, entry in entries.items():
+                if other != config and set(entry['outputs']) & set(outputs):
+                    log('Warning: %r overwrote the scripts for %r, '
+                        'same program name?', config, other)
+            entries[config] = dict(hash=todo[config], outputs=outputs)
+    finally:
+        if pool:
+            pool.shutdown()
+        os.makedirs(path.dirname(path.abspath(manifest)), exist_ok=True)
+        save_manifest(manifest, entries)
+    return len(todo) - failed, skipped, failed
+
+
+def _changed(configs, shells, entries, force=False):
+    """The configuration files to generate for, with their hashes
+
+    Returns them, and the number of the ones skipped as unchanged.
+    """
+    todo = {}
+    skipped = 0
+    for config in find_configs(configs):
+        digest = config_hash(config, shells)
+        entry = entries.get(config)
+        if (not force and entry and entry['hash'] == digest
+                and all(path.isfile(output) for output in entry['outputs'])):
+            skipped += 1
+        else:
+            todo[config] = digest
+    return todo, skipped
+
+
+def _call(func, *args):
+    """Call a function, return its result and the exception raised"""
+    try:
+        return func(*args), None
+    except Exception as exc: # pylint: disable=broad-except
+        return None, exc
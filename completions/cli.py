@@ -0,0 +1,372 @@
+"""
+The command line interface
+
+The options and the subcommands are set up for pyparam, then the command
+parsed is run. The modules the commands need are imported by them.
+"""
+import sys
+from os import environ
+
+from completions import Completions, _AtomicFile, generate_bundle_to, log
+
+
+def _setup_global(commands):
+    """The global options"""
+    commands._desc = 'Shell completions for your program made easy.'
+    commands._.shell = 'auto'
+    commands._.shell.desc = [
+        'The shell, one of bash, fish, zsh and auto.',
+        'Shell will be detected from `os.environ["SHELL"]` if auto.',
+    ]
+    commands._.auto = False
+    commands._.auto.desc = [
+        'Automatically write completions to destination file.',
+        'Bash: `~/bash_completion.d/<name>.bash-completion`',
+        '  Also try to source it in ~/.bash_completion',
+        'Fish: `~/.config/fish/completions/<name>.fish`',
+        'Zsh:  `~/.zsh-completions/_<name>`',
+        '  `fpath+=~/.zsh-completions` is ensured to add before `compinit`'
+    ]
+    commands._.lazy = False
+    commands._.lazy.desc = [
+        'With `--auto`, keep the shell startup fast by loading completions '
+        'on the first TAB.',
+        'Bash: a stub is written to '
+        '`~/bash_completion.d/<name>.bash-completion`',
+        '  and the full script to `~/bash_completion.d/full/<name>.bash`',
+        'Fish and zsh autoload the completion files already.'
+    ]
+    commands._.zcompile = False
+    commands._.zcompile.desc = [
+        'With `--auto`, compile the zsh completion file to '
+        '`~/.zsh-completions/_<name>.zwc`,',
+        '  which zsh loads faster than the source.'
+    ]
+    commands._.minify = False
+    commands._.minify.desc = [
+        'Generate the code without the indentation and the comments, and '
+        'with shorter names.',
+        'For zsh and fish, each description is stored once as well.'
+    ]
+    commands._.cache = False
+    commands._.cache.desc = [
+        'Cache the loaded configuration files, so that they are not parsed '
+        'again until changed.',
+        'Cached in `${XDG_CACHE_HOME:-~/.cache}/completions/specs/`'
+    ]
+    commands._.profile = False
+    commands._.profile.desc = [
+        'Print the wall time of the phases of loading and generating to stderr.'
+    ]
+    commands._.memory = False
+    commands._.memory.desc = [
+        'With `--profile`, print the peak memory of the phases as well.',
+        'Tracing the memory slows the phases down several times.'
+    ]
+    commands._.a = commands._.auto
+    commands._.s = commands._.shell
+
+
+def _setup_self(commands):
+    """The self command"""
+    commands.self = 'Generate completions for myself.'
+    commands.self._hbald = False
+
+
+def _setup_generate(commands):
+    """The generate command"""
+    commands.generate = 'Generate completions from configuration files'
+    commands.generate.config.desc = [  # pylint: disable=no-member
+        'The configuration file. Scheme should be aligned following schema:',
+        '```yaml', 'program:',
+        '    name: completions',
+        '    desc: Shell completions for your program made easy.',
+        '    path: /absolute/path/to/completions',
+        '    inherit: true',
+        '    options:',
+        '        -s: The shell, one of bash, fish, zsh and auto.',
+        '        --shell: The shell, one of bash, fish, zsh and auto.',
+        '        -a: Automatically write completions to destination file.',
+        '        --auto: Automatically write completions to destination file.',
+        '        # values of an option completed from a shell command',
+        '        --host:',
+        '            desc: The host to connect.',
+        '            provider: my-program list-hosts',
+        '            ttl: 3600     # cache the values for an hour',
+        '            timeout: 1.0  # wait no longer for a refresh',
+        'commands:',
+        '    self: Generate completions for myself.',
+        '    generate:',
+        '        desc: Generate completions from configuration files.',
+        '        options:',
+        '            -c: The configuration file to load.',
+        '            --config: The configuration file to load.',
+        '        # subcommands are nested the same way',
+        '        commands:',
+        '            bash: Generate completions for bash.',
+        '```',
+        'Configuration file should be supported by `python-simpleconf`.'
+    ]
+    commands.generate.config.required = True  # pylint: disable=no-member
+    commands.generate.c = commands.generate.config  # pylint: disable=no-member
+
+
+def _setup_serve(commands):
+    """The serve command"""
+    commands.serve = ('Serve completion queries from memory over a UNIX '
+                      'socket, including the values of the options.')
+    commands.serve.config = []  # pylint: disable=no-member
+    commands.serve.config.desc = [  # pylint: disable=no-member
+        'The configuration files of the programs to serve.'
+    ]
+    commands.serve.config.required = True  # pylint: disable=no-member
+    commands.serve.c = commands.serve.config  # pylint: disable=no-member
+    commands.serve.socket.desc = [  # pylint: disable=no-member
+        'The UNIX socket to listen on.',
+        'Default: `$COMPLETIONS_SOCKET`, or',
+        '`${XDG_RUNTIME_DIR:-/tmp}/completions-$USER.sock`,',
+        'where the generated scripts look for it.'
+    ]
+
+
+def _setup_source(commands):
+    """The source command"""
+    commands.source = ('Generate completions from the source of a program '
+                       'using argparse or click, without running it.')
+    commands.source.file.desc = [  # pylint: disable=no-member
+        'The python file where the parser or the click commands are defined.'
+    ]
+    commands.source.file.required = True  # pylint: disable=no-member
+    commands.source.f = commands.source.file  # pylint: disable=no-member
+    commands.source.name.desc = [  # pylint: disable=no-member
+        'The name of the program.',
+        'Default: `prog` of the argparse parser, or the name of the file.'
+    ]
+    commands.source.n = commands.source.name  # pylint: disable=no-member
+
+
+def _setup_batch(commands):
+    """The batch command"""
+    commands.batch = ('Generate completions for many configuration files '
+                      'and shells at once.')
+    commands.batch.config = []  # pylint: disable=no-member
+    commands.batch.config.desc = [  # pylint: disable=no-member
+        'The configuration files, or directories of them.',
+        'Python files given are read as by the `source` command.',
+        'Unchanged ones since last run are skipped.'
+    ]
+    commands.batch.config.required = True  # pylint: disable=no-member
+    commands.batch.c = commands.batch.config  # pylint: disable=no-member
+    commands.batch.shells = ['bash', 'fish', 'zsh']  # pylint: disable=no-member
+    commands.batch.shells.type = 'list:reset'  # pylint: disable=no-member
+    commands.batch.shells.desc = [  # pylint: disable=no-member
+        'The shells to generate completions for.'
+    ]
+    commands.batch.outdir = '.'  # pylint: disable=no-member
+    commands.batch.outdir.desc = [  # pylint: disable=no-member
+        'The directory to write to, one subdirectory for each shell.'
+    ]
+    commands.batch.o = commands.batch.outdir  # pylint: disable=no-member
+    commands.batch.jobs = 0  # pylint: disable=no-member
+    commands.batch.jobs.desc = [  # pylint: disable=no-member
+        'The number of processes. Default: the number of CPUs.'
+    ]
+    commands.batch.j = commands.batch.jobs  # pylint: disable=no-member
+    commands.batch.manifest.desc = [  # pylint: disable=no-member
+        'The manifest file with the hashes of the configuration files.',
+        'Default: `<outdir>/.completions-manifest.json`'
+    ]
+    commands.batch.force = False  # pylint: disable=no-member
+    commands.batch.force.desc = [  # pylint: disable=no-member
+        'Generate for all configuration files, even unchanged ones.'
+    ]
+
+
+def _setup_bundle(commands):
+    """The bundle command"""
+    commands.bundle = ('Generate completions for many programs as one file, '
+                       'sharing the code completing them.')
+    commands.bundle.config = []  # pylint: disable=no-member
+    commands.bundle.config.desc = [  # pylint: disable=no-member
+        'The configuration files, or directories of them.',
+        'Python files given are read as by the `source` command.'
+    ]
+    commands.bundle.config.required = True  # pylint: disable=no-member
+    commands.bundle.c = commands.bundle.config  # pylint: disable=no-member
+    commands.bundle.output.desc = [  # pylint: disable=no-member
+        'The file to write to. Default: the standard output.',
+        'Only bash supported, source it in your `~/.bashrc`.'
+    ]
+    commands.bundle.o = commands.bundle.output  # pylint: disable=no-member
+
+
+def _setup_watch(commands):
+    """The watch command"""
+    commands.watch = ('Install completions, and again each time the '
+                      'configuration files change.')
+    commands.watch.config = []  # pylint: disable=no-member
+    commands.watch.config.desc = [  # pylint: disable=no-member
+        'The configuration files, or directories of them.',
+        'Python files given are read as by the `source` command.'
+    ]
+    commands.watch.config.required = True  # pylint: disable=no-member
+    commands.watch.c = commands.watch.config  # pylint: disable=no-member
+    commands.watch.shells = []  # pylint: disable=no-member
+    commands.watch.shells.desc = [  # pylint: disable=no-member
+        'The shells to install completions for. Default: `--shell`.'
+    ]
+    commands.watch.debounce = 0.2  # pylint: disable=no-member
+    commands.watch.debounce.desc = [  # pylint: disable=no-member
+        'Seconds without more changes before installing again.'
+    ]
+    commands.watch.poll = False  # pylint: disable=no-member
+    commands.watch.poll.desc = [  # pylint: disable=no-member
+        'Poll the files instead of watching them by inotify,',
+        'such as for network filesystems. Polled anyway without inotify.'
+    ]
+    commands.watch.interval = 0.5  # pylint: disable=no-member
+    commands.watch.interval.desc = [  # pylint: disable=no-member
+        'Seconds between the polls.'
+    ]
+
+
+def _setup_stats(commands):
+    """The stats command"""
+    commands.stats = ('Summarize the latencies of the completion requests '
+                      'traced with `$COMPLETIONS_TRACE`.')
+    commands.stats._hbald = False  # pylint: disable=no-member
+    commands.stats.trace = []  # pylint: disable=no-member
+    commands.stats.trace.desc = [  # pylint: disable=no-member
+        'The trace files. Default: `$COMPLETIONS_TRACE`.',
+        'With `$COMPLETIONS_TRACE` set to a file, the generated scripts append',
+        'the time of each completion request to it.'
+    ]
+    commands.stats.t = commands.stats.trace  # pylint: disable=no-member
+
+
+def _serve(options, goptions):
+    """Serve the completions of the configuration files"""
+    from completions.daemon import Daemon
+    specs = []
+    for config in options['config']:
+        completions = Completions()
+        completions.load_file(config, cache=goptions['cache'])
+        specs.append(completions)
+    Daemon(specs).serve(options['socket'])
+
+
+def _batch(options):
+    """Generate for the configuration files and the shells"""
+    from completions.batch import batch
+    generated, skipped, failed = batch(options['config'],
+                                       options['shells'],
+                                       options['outdir'],
+                                       jobs=options['jobs'] or None,
+                                       manifest=options['manifest'],
+                                       force=options['force'])
+    log('%s generated, %s unchanged, %s failed.', generated, skipped,
+        failed)
+    if failed:
+        sys.exit(1)
+
+
+def _stats(options):
+    """Print the summary of the traces"""
+    from completions.stats import read_traces, summarize, format_summary
+    tracefiles = options['trace']
+    if not tracefiles and environ.get('COMPLETIONS_TRACE'):
+        tracefiles = [environ['COMPLETIONS_TRACE']]
+    if not tracefiles:
+        raise ValueError('No trace files given, nor $COMPLETIONS_TRACE.')
+    for line in format_summary(summarize(read_traces(tracefiles))):
+        print(line)
+
+
+def _watch(options, goptions):
+    """Install the completions, again once the configuration files change"""
+    from completions.batch import find_configs
+    from completions.watch import watch
+    try:
+        watch(list(find_configs(options['config'])),
+              options['shells'] or [goptions['shell']],
+              interval=options['interval'],
+              debounce=options['debounce'],
+              poll=options['poll'],
+              cache=goptions['cache'],
+              lazy=goptions['lazy'],
+              zcompile=goptions['zcompile'],
+              minify=goptions['minify'])
+    except KeyboardInterrupt:
+        pass
+
+
+def _bundle(options, goptions, profile):
+    """Generate the completions of the programs as one file"""
+    from completions.batch import find_configs, load_config
+    specs = [
+        load_config(config, cache=goptions['cache'], profile=profile)
+        for config in find_configs(options['config'])
+    ]
+    if options['output']:
+        with _AtomicFile(options['output']) as fout:
+            generate_bundle_to(fout, specs, goptions['shell'], profile)
+    else:
+        generate_bundle_to(sys.stdout, specs, goptions['shell'], profile)
+
+
+def _generate(command, options, goptions, profile):
+    """Generate from a configuration file, or from the source of a program"""
+    if command == 'source':
+        completions = Completions.from_source(options['file'],
+                                              options['name'],
+                                              profile=profile)
+    else:
+        completions = Completions()
+        completions.load_file(options['config'],
+                              cache=goptions['cache'],
+                              profile=profile)
+    if goptions['auto']:
+        completions.generate(goptions['shell'],
+                             auto=True,
+                             lazy=goptions['lazy'],
+                             profile=profile,
+                             zcompile=goptions['zcompile'],
+                             minify=goptions['minify'])
+    else:
+        completions.generate_to(sys.stdout, goptions['shell'], profile,
+                                goptions['minify'])
+
+
+def main():
+    """Entry point of the script"""
+    from pyparam import commands
+    for setup in (_setup_global, _setup_self, _setup_generate, _setup_serve,
+                  _setup_source, _setup_batch, _setup_bundle, _setup_watch,
+                  _setup_stats):
+        setup(commands)
+    command, options, goptions = commands._parse()
+
+    profile = None
+    if goptions['profile']:
+        from completions.profiling import Profile
+        profile = Profile(memory=goptions['memory'])
+    if command == 'self':
+        source = commands._complete(goptions['shell'], auto=goptions['auto'])
+        if not goptions['auto']:
+            print(source)
+    elif command == 'serve':
+        _serve(options, goptions)
+    elif command == 'batch':
+        _batch(options)
+    elif command == 'stats':
+        _stats(options)
+    elif command == 'watch':
+        _watch(options, goptions)
+    elif command == 'bundle':
+        _bundle(options, goptions, profile)
+    else:
+        _generate(command, options, goptions, profile)
+
+    if profile:
+        for line in profile.report():
+            sys.stderr.write(line + '\n')
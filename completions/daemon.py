@@ -0,0 +1,205 @@
+"""
+A daemon answering completion queries over a UNIX socket
+
+The specs are loaded once, and the values of the options are kept in memory,
+so that a query costs neither the start of the interpreter nor the provider.
+
+The protocol is a line per connection: the program name and the words after
+it, the last one being the word to complete, all separated by tabs. The
+candidates are sent back one per line, ended by an empty line, then the
+connection is closed. For a program not served, the connection is closed
+without the empty line, for the scripts to fall back to their cache files.
+"""
+import errno
+import os
+import signal
+import socket
+import socketserver
+import subprocess
+import threading
+import sys
+import time
+from bisect import bisect_left
+from importlib import import_module
+from os import path
+from stat import S_ISSOCK
+
+
+def default_socket():
+    """The socket the daemon listens on if not specified
+
+    The generated scripts look for the same one.
+    """
+    return os.environ.get('COMPLETIONS_SOCKET') or path.join(
+        os.environ.get('XDG_RUNTIME_DIR') or '/tmp',
+        'completions-%s.sock' % os.environ.get('USER', ''))
+
+
+# only get() is needed, the refreshing is kept inside
+class Values: # pylint: disable=too-few-public-methods
+    """The values of an option, kept in memory and refreshed when stale"""
+    def __init__(self, provider):
+        self.provider = provider
+        self.values = []
+        self.stamp = None
+        self.lock = threading.Lock()
+        self.refreshing = None
+
+    def _fetch(self):
+        command = self.provider.command
+        if command.startswith('python:'):
+            # python:package.module:function, called in the daemon itself
+            modname, funcname = command[7:].split(':', 1)
+            values = getattr(import_module(modname), funcname)()
+        else:
+            values = subprocess.check_output(
+                command, shell=True,
+                universal_newlines=True).splitlines()
+        values = [str(value) for value in values]
+        # searched by prefix, see starting()
+        return sorted(set(values)) if self.provider.index else values
+
+    def _refresh(self):
+        try:
+            self.values = self._fetch()
+            self.stamp = time.time()
+        except Exception:  # pylint: disable=broad-except
+            pass
+        finally:
+            self.refreshing = None
+
+    def get(self):
+        """Get the values, waiting for a refresh no longer than the timeout"""
+        if (self.stamp is not None
+                and self.stamp + self.provider.ttl >= time.time()):
+            return self.values
+        with self.lock:
+            refreshing = self.refreshing
+            if refreshing is None:
+                refreshing = self.refreshing = threading.Thread(
+                    target=self._refresh, daemon=True)
+                refreshing.start()
+        refreshing.join(self.provider.timeout)
+        return self.values
+
+
+def starting(values, prefix):
+    """The sorted values starting with the prefix, by a binary search"""
+    start = end = bisect_left(values, prefix)
+    while end < len(values) and values[end].startswith(prefix):
+        end += 1
+    return values[start:end]
+
+
+def complete(completions, words, values):
+    """Get the candidates for the last word of given words
+
+    The command tree is walked down the same way as the generated scripts.
+    """
+    cur = words[-1] if words else ''
+    command = completions
+    for word in words[:-1]:
+        if not word.startswith('-') and word in command.commands:
+            command = command.commands[word]
+
+    prev = words[-2] if len(words) > 1 else ''
+    providers = completions.providers_of(command)
+    # an option overriding a global one only has values of its own, if any
+    if (prev.startswith('-') and prev in providers
+            and (prev in command.providers or prev not in command.options)):
+        provider = providers[prev]
+        # shared by the commands inheriting the option
+        key = provider.ident
+        if key not in values:
+            values[key] = Values(provider)
+        if provider.index:
+            return starting(values[key].get(), cur)
+        candidates = values[key].get()
+    elif cur.startswith('-'):
+        candidates = list(completions.options_of(command))
+    else:
+        candidates = list(command.commands)
+    return [cand for cand in candidates if cand.startswith(cur)]
+
+
+def _claim(socket_path):
+    """Remove the socket left by a daemon no longer running, if any
+
+    Refused for a daemon still listening on it, or for a file that is not a
+    socket of the user, none of which is for this daemon to remove. The
+    scripts only talk to a socket of the user either, as anyone can put one
+    in /tmp.
+    """
+    try:
+        stat = os.lstat(socket_path)
+    except FileNotFoundError:
+        return
+    if not S_ISSOCK(stat.st_mode):
+        raise OSError(errno.EEXIST, 'Not a socket', socket_path)
+    if stat.st_uid != os.getuid():
+        raise OSError(errno.EPERM, 'The socket of another user', socket_path)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except OSError:
+        # nothing listening, stale
+        pass
+    else:
+        raise OSError(errno.EADDRINUSE, 'A daemon is already listening',
+                      socket_path)
+    finally:
+        client.close()
+    os.remove(socket_path)
+
+
+class Daemon:
+    """Answer completion queries for the loaded specs"""
+    def __init__(self, completions_list):
+        self.specs = {}
+        self.values = {}
+        for completions in completions_list:
+            self.specs[completions.name] = completions
+
+    def query(self, line):
+        """Answer a query line, None if the program is not served"""
+        fields = line.rstrip('\n').split('\t')
+        completions = self.specs.get(path.basename(fields[0]))
+        if completions is None:
+            return None
+        return complete(completions, fields[1:], self.values)
+
+    def serve(self, socket_path=None):
+        """Serve forever on the socket"""
+        socket_path = socket_path or default_socket()
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            """Handle a query"""
+            def handle(self):
+                line = self.rfile.readline().decode()
+                candidates = daemon.query(line)
+                if candidates is None:
+                    # not answered, for the scripts to use the cache files
+                    return
+                candidates.append('')
+                self.wfile.write(''.join(cand + '\n'
+                                         for cand in candidates).encode())
+
+        # clean up the socket when terminated, only the main thread can
+        # handle signals
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        _claim(socket_path)
+        old_umask = os.umask(0o077)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(socket_path,
+                                                            Handler)
+        finally:
+            os.umask(old_umask)
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if path.exists(socket_path):
+                os.remove(socket_path)
@@ -0,0 +1,133 @@
+"""
+Load a YAML configuration file command by command, reusing the unchanged ones
+
+Parsing is most of the time to generate from a large configuration file.
+The file is split at the top-level commands, and each of them is parsed on
+its own, with the result cached by the hash of its text, so that after a
+small edit of the file, only the commands changed are parsed again.
+
+The files not split safely (with anchors, aliases, tags, several documents,
+tabs, or `commands` not in the block style) are parsed as a whole.
+"""
+import hashlib
+import pickle
+import re
+
+from completions import __version__, _AtomicFile
+
+# anchors, aliases and tags, if at the start of a node
+NODE_PROPERTY = re.compile(r'[&*!]\S')
+COMMANDS = re.compile(r'^commands:[ \t]*(?:#.*)?$', re.M)
+# the next top-level key, and the first line of a command
+TOP_LEVEL = re.compile(r'\n[^\s#]')
+INDENTED = re.compile(r'\n( *)[^ #\n]')
+
+
+def _unsafe(text):
+    """If anything could refer to, or change the meaning of, other parts
+
+    Such as anchors, aliases, tags, merge keys, documents or tabs, which are
+    looked for loosely, as they are rare in the configuration files.
+    """
+    if ('\t' in text or '<<' in text or '\n---' in text or '\n...' in text
+            or text.startswith(('---', '...'))):
+        return True
+    return any(match.start() == 0 or text[match.start() - 1] in ' \n[{,'
+               for match in NODE_PROPERTY.finditer(text))
+
+
+def split_commands(text):
+    """Split a YAML file into the rest of it and the top-level commands
+
+    Returns the text without the commands, and the text of each command, or
+    None if the file cannot be split safely.
+    """
+    if _unsafe(text):
+        return None
+    starts = list(COMMANDS.finditer(text))
+    if len(starts) != 1:
+        return None
+    start = starts[0].end() + 1
+    # the section ends at the next top-level key
+    end = TOP_LEVEL.search(text, start - 1)
+    end = end.start() + 1 if end else len(text)
+    section = '\n' + text[start:end]
+    first = INDENTED.search(section)
+    if not first:
+        return text[:starts[0].start()] + text[end:], []
+    level = len(first.group(1))
+    if not level or (level > 1 and re.search(
+            r'\n {1,%d}[^ #\n]' % (level - 1), section)):
+        return None
+    # comments and blank lines go with the command before them
+    bounds = [match.start() + 1 for match in re.finditer(
+        r'\n {%d}[^ #\n]' % level, section)] + [len(section)]
+    return (text[:starts[0].start()] + text[end:],
+            [section[bounds[i]:bounds[i + 1]]
+             for i in range(len(bounds) - 1)])
+
+
+def _load_fragments(cachefile):
+    """The commands parsed before, keyed by the hash of their text"""
+    try:
+        with open(cachefile, 'rb') as fcache:
+            cached = pickle.load(fcache)
+        if cached['version'] == __version__:
+            return cached['fragments']
+    except Exception:  # pylint: disable=broad-except
+        pass
+    return {}
+
+
+def _parse_fragments(chunks, cached, loader):
+    """Parse the commands not cached, None if any is not a command after all
+
+    The ones cached are taken out of `cached`, leaving the ones no longer in
+    the file.
+    """
+    import yaml
+    fragments = {}
+    for chunk in chunks:
+        key = hashlib.sha1(chunk.encode()).hexdigest()
+        if key not in cached:
+            parsed = yaml.load(chunk, Loader=loader)
+            if not isinstance(parsed, dict) or len(parsed) != 1:
+                return None
+            cached[key] = parsed
+        fragments[key] = cached.pop(key)
+    return fragments
+
+
+def load_yaml(compfile, cachefile):
+    """Load a YAML configuration file, parsing only the commands changed
+
+    The commands parsed are cached in `cachefile`, keyed by the hash of their
+    text. Returns the configuration as a dict.
+    """
+    import yaml
+    # the same loader as python-simpleconf, in C if available
+    loader = getattr(yaml, 'CLoader', yaml.Loader)
+    with open(compfile) as fconf:
+        text = fconf.read()
+    split = split_commands(text)
+    if split is None:
+        return yaml.load(text, Loader=loader)
+
+    cached = _load_fragments(cachefile)
+    nfragments = len(cached)
+    rest, chunks = split
+    fragments = _parse_fragments(chunks, cached, loader)
+    if fragments is None:
+        return yaml.load(text, Loader=loader)
+    config = yaml.load(rest, Loader=loader) or {}
+    config['commands'] = {} if chunks else None
+    for fragment in fragments.values():
+        config['commands'].update(fragment)
+
+    # only the commands of the file now are kept
+    if cached or len(fragments) != nfragments:
+        with _AtomicFile(cachefile, 'wb') as fcache:
+            pickle.dump(dict(version=__version__, fragments=fragments),
+                        fcache,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    return config
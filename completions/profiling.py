@@ -0,0 +1,114 @@
+"""
+Wall time and peak memory of the phases of loading and generating
+
+A `Profile` is passed to `Completions.load_file()`, `from_source()`,
+`generate()` or `generate_to()`, which record their phases to it:
+- parse: the configuration file or the source parsed to a dict;
+- load: the dict loaded to the commands and options;
+- cache/cache write: the loaded completions read from or written to cache;
+- assemble_<shell>_...: the code assembled. It is streamed to the phase
+  consuming it, so only the time spent producing the chunks is counted;
+- write: the code written to a file object;
+- install: the installer, hashing the code, and writing it if changed.
+
+The peak memory is of the memory allocated by python, traced by
+`tracemalloc`, which slows everything down. Compare the times of runs with
+and without the memory traced separately.
+"""
+import time
+import tracemalloc
+from collections import namedtuple
+from contextlib import contextmanager
+
+# depth: the number of phases it is in; peak: bytes, None if not traced
+Phase = namedtuple('Phase', 'name depth seconds peak')
+
+
+class _Timer: # pylint: disable=too-few-public-methods
+    """The time not counted in a phase"""
+    def __init__(self):
+        self.paused = 0.0
+
+
+class Profile:
+    """Record the phases, to be reported or sent to a callback
+
+    The phases are in `phases`, in the order they are started, once they
+    are done. `callback` is called with each of them when it is done.
+    """
+    def __init__(self, callback=None, memory=True):
+        self.callback = callback
+        self.memory = memory
+        self.phases = []
+        # the peaks of the phases running, the outer ones first
+        self._peaks = []
+        self._depth = 0
+
+    @staticmethod
+    def _peak():
+        """The peak traced since the last call"""
+        peak = tracemalloc.get_traced_memory()[1]
+        # python 3.9+, otherwise the peak since the tracing started
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        return peak
+
+    @contextmanager
+    def phase(self, name):
+        """Record a phase, around the code in the context"""
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        if self.memory:
+            # the peak so far belongs to the phase this one is in
+            peak = self._peak()
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            self._peaks.append(0)
+
+        index = len(self.phases)
+        self.phases.append(None)
+        self._depth += 1
+        timer = _Timer()
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            seconds = time.perf_counter() - start - timer.paused
+            self._depth -= 1
+            peak = None
+            if self.memory:
+                peak = max(self._peaks.pop(), self._peak())
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+            if started:
+                tracemalloc.stop()
+            self.phases[index] = Phase(name, self._depth, seconds, peak)
+            if self.callback:
+                self.callback(self.phases[index])
+
+    def chunks(self, name, chunks):
+        """Record a phase producing the chunks, as they are consumed
+
+        The time the consumer spends on the chunks is not counted, the peak
+        memory is of both.
+        """
+        with self.phase(name) as timer:
+            for chunk in chunks:
+                paused = time.perf_counter()
+                yield chunk
+                timer.paused += time.perf_counter() - paused
+
+    def report(self):
+        """Format the phases done, yield the lines"""
+        width = max([len(phase.name) + 2 * phase.depth
+                     for phase in self.phases if phase] + [5])
+        for phase in self.phases:
+            if not phase:
+                continue
+            line = '%s%s %10.2fms' % ('  ' * phase.depth,
+                                      phase.name.ljust(width - 2 * phase.depth),
+                                      phase.seconds * 1000)
+            if phase.peak is not None:
+                line += '  peak %8.2fMB' % (phase.peak / 1024.0 / 1024.0)
+            yield line
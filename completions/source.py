@@ -0,0 +1,326 @@
+"""
+Extract the completions from the source of argparse or click programs
+
+The source is parsed, but not executed, so that none of the modules the
+program imports is loaded. The parsers are followed through the names they
+are assigned to:
+- argparse: `ArgumentParser()`, `add_subparsers()`, `add_parser()`,
+  `add_argument()`, the argument groups and the `parents` of a parser;
+- click: the functions decorated by `command()` or `group()`, of which the
+  `option()`s, and the commands added to the groups by `<group>.command()`,
+  `<group>.group()` or `<group>.add_command()`.
+
+Only literal strings are taken, as the names and the help of the options
+and commands. Anything built at runtime is out of reach.
+"""
+import ast
+import sys
+from os import path
+
+from completions import CompletionsLoadError
+
+# click decorators adding an option, with the names and help by default
+CLICK_OPTIONS = dict(
+    option=((), ''),
+    version_option=(('--version', ), 'Show the version and exit.'),
+    help_option=(('--help', ), 'Show this message and exit.'),
+    password_option=(('--password', ), ''),
+    confirmation_option=(('--yes', ), 'Confirm the action without prompting.'),
+)
+
+
+def _literal(node, default=None):
+    """The value of a literal, the default if it isn't one
+
+    Before python 3.8, strings are ast.Str, and True, False and None are
+    ast.NameConstant.
+    """
+    if sys.version_info < (3, 8):
+        if isinstance(node, ast.Str):
+            return node.s
+        if isinstance(node, ast.NameConstant):
+            return node.value
+    elif isinstance(node, ast.Constant):
+        return node.value
+    return default
+
+
+def _string(node):
+    """The value of a literal string, None if it isn't one"""
+    value = _literal(node)
+    return value if isinstance(value, str) else None
+
+
+def _keyword(call, name):
+    """The value of a keyword argument of a call"""
+    for keyword in call.keywords:
+        if keyword.arg == name:
+            return keyword.value
+    return None
+
+
+def _help(call, name='help'):
+    """The first line of the help of a call, None if suppressed"""
+    value = _keyword(call, name)
+    if isinstance(value, ast.Attribute) and value.attr == 'SUPPRESS':
+        return None
+    return ' '.join((_string(value) or '').split('\n\n')[0].split())
+
+
+def _target(node):
+    """The dotted name of an assignment target, such as `self.parser`"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        parent = _target(node.value)
+        return parent and '%s.%s' % (parent, node.attr)
+    return None
+
+
+def _called(node):
+    """The name of the function called, the attribute for a method"""
+    func = node.func if isinstance(node, ast.Call) else node
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    if isinstance(func, ast.Name):
+        return func.id
+    return None
+
+
+def _command(desc=''):
+    """A command, in the schema that `Completions.load()` takes"""
+    return {'desc': desc, 'options': {}, 'commands': {}}
+
+
+class ArgparseVisitor(ast.NodeVisitor):
+    """Follow the argparse parsers through the module"""
+    def __init__(self):
+        # the names assigned with a parser or subparsers, and the command
+        self.names = {}
+        self.parsers = []
+        self.parents = []
+
+    def resolve(self, node):
+        """What an expression is, ('parser'|'subparsers', command) or None"""
+        if isinstance(node, ast.Call):
+            return self.call(node)
+        key = _target(node)
+        return key and self.names.get(key)
+
+    def call(self, node):
+        """Handle a call, return what it returns"""
+        if _called(node) == 'ArgumentParser':
+            return self.parser(node, _command(_help(node, 'description')))
+        owner = (isinstance(node.func, ast.Attribute)
+                 and self.resolve(node.func.value))
+        handler = owner and self.HANDLERS.get((owner[0], _called(node)))
+        return handler(self, node, owner) if handler else None
+
+    def add_subparsers(self, node, owner): # pylint: disable=unused-argument
+        """<parser>.add_subparsers()"""
+        return 'subparsers', owner[1]
+
+    def add_group(self, node, owner): # pylint: disable=unused-argument
+        """<parser>.add_argument_group(), the options go to the parser"""
+        return owner
+
+    def add_argument(self, node, owner):
+        """<parser>.add_argument()"""
+        desc = _help(node)
+        if desc is not None:
+            for arg in node.args:
+                option = _string(arg)
+                if option and option.startswith('-'):
+                    owner[1]['options'][option] = desc
+
+    def add_parser(self, node, owner):
+        """<subparsers>.add_parser(), a new parser of a subcommand"""
+        name = node.args and _string(node.args[0])
+        if not name:
+            return None
+        command = owner[1]
+        subcommand = _command(_help(node) or
+                              _help(node, 'description') or '')
+        command['commands'][name] = subcommand
+        aliases = _keyword(node, 'aliases')
+        for alias in getattr(aliases, 'elts', []):
+            if _string(alias):
+                command['commands'][_string(alias)] = subcommand
+        return self.parser(node, subcommand)
+
+    # the methods handled, by the kind of what they are called on
+    HANDLERS = {
+        ('parser', 'add_subparsers'): add_subparsers,
+        ('parser', 'add_argument_group'): add_group,
+        ('parser', 'add_mutually_exclusive_group'): add_group,
+        ('parser', 'add_argument'): add_argument,
+        ('subparsers', 'add_parser'): add_parser,
+    }
+
+    def parser(self, node, command):
+        """A new parser, with the options of its parents and -h/--help"""
+        if _literal(_keyword(node, 'add_help'), True):
+            command['options'].update({'-h': 'show this help message and exit',
+                                       '--help':
+                                       'show this help message and exit'})
+        for parent in getattr(_keyword(node, 'parents'), 'elts', []):
+            parent = self.resolve(parent)
+            if parent:
+                self.parents.append(parent[1])
+                command['options'].update(parent[1]['options'])
+        if _called(node) == 'ArgumentParser':
+            self.parsers.append((command, _string(_keyword(node, 'prog'))))
+        return 'parser', command
+
+    def visit_Assign(self, node): # pylint: disable=invalid-name
+        """Name the parsers"""
+        value = self.resolve(node.value)
+        for target in node.targets:
+            key = _target(target)
+            if key and value:
+                self.names[key] = value
+
+    def visit_AnnAssign(self, node): # pylint: disable=invalid-name
+        """Name the parsers, with annotations"""
+        if node.value:
+            value = self.resolve(node.value)
+            key = _target(node.target)
+            if key and value:
+                self.names[key] = value
+
+    def visit_Expr(self, node): # pylint: disable=invalid-name
+        """The calls not assigned, such as add_argument()"""
+        self.resolve(node.value)
+
+    def root(self):
+        """The parser of the program and its `prog`, not a parent of others
+
+        The first one with subcommands if there are many of them.
+        """
+        roots = [(parser, prog) for parser, prog in self.parsers
+                 if not any(parser is parent for parent in self.parents)]
+        return next((root for root in roots if root[0]['commands']),
+                    roots[0] if roots else (None, None))
+
+
+class ClickVisitor(ast.NodeVisitor):
+    """Follow the click commands and groups through the module"""
+    def __init__(self):
+        # the commands and their names, by the functions decorated
+        self.functions = {}
+        self.children = []
+        self.order = []
+
+    def visit_FunctionDef(self, node): # pylint: disable=invalid-name
+        """A function decorated as a command or a group"""
+        command = None
+        options = {}
+        # options are listed the same way as decorated, top to bottom
+        for decorator in node.decorator_list:
+            called = _called(decorator)
+            if called in ('command', 'group'):
+                command = self.command(node, decorator)
+            elif called in CLICK_OPTIONS and isinstance(decorator, ast.Call):
+                names = [_string(arg) for arg in decorator.args]
+                names = [
+                    name for decl in names if decl
+                    for name in decl.split('/') if name.startswith('-')
+                ] or CLICK_OPTIONS[called][0]
+                desc = _help(decorator) or CLICK_OPTIONS[called][1]
+                for name in names:
+                    options[name] = desc
+        if command is not None:
+            command['options'].update(options)
+            command['options']['--help'] = 'Show this message and exit.'
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def command(self, node, decorator):
+        """The command of a function decorated by command() or group()"""
+        call = decorator if isinstance(decorator, ast.Call) else None
+        name = call and (_string(_keyword(call, 'name')) or
+                         (call.args and _string(call.args[0])))
+        desc = call and _help(call)
+        if not desc:
+            docstring = ast.get_docstring(node) or ''
+            desc = ' '.join(docstring.split('\n\n')[0].split())
+        command = _command(desc)
+        name = name or node.name.replace('_', '-')
+        self.functions[node.name] = command, name
+        self.order.append(command)
+
+        func = decorator.func if call else decorator
+        group = (isinstance(func, ast.Attribute)
+                 and self.functions.get(_target(func.value)))
+        if group:
+            self.add(group[0], command, name)
+        return command
+
+    def add(self, group, command, name):
+        """Add a command to a group"""
+        group['commands'][name] = command
+        self.children.append(command)
+
+    def visit_Expr(self, node): # pylint: disable=invalid-name
+        """<group>.add_command(<function>, name=...)"""
+        call = node.value
+        if (isinstance(call, ast.Call) and _called(call) == 'add_command'
+                and isinstance(call.func, ast.Attribute) and call.args):
+            group = self.functions.get(_target(call.func.value))
+            command = self.functions.get(_target(call.args[0]))
+            if group and command:
+                name = (_string(_keyword(call, 'name')) or
+                        (len(call.args) > 1 and _string(call.args[1])) or
+                        command[1])
+                self.add(group[0], command[0], name)
+
+    def root(self):
+        """The command of the program, the first group not added to others"""
+        roots = [command for command in self.order
+                 if not any(command is child for child in self.children)]
+        return next((command for command in roots if command['commands']),
+                    roots[0] if roots else None)
+
+
+def spec_from_source(filename, name=None):
+    """Extract the completions from the source of a program
+
+    Returns a dict in the schema that `Completions.load()` takes. The name of
+    the program is, if not given, the `prog` of the argparse parser, or the
+    name of the file without `.py` (of the package for a `__main__.py`).
+    """
+    with open(filename, 'rb') as fsrc:
+        source = fsrc.read()
+    # parsing is most of the time, not worth it for other modules
+    if b'ArgumentParser' in source or b'click' in source:
+        tree = ast.parse(source, filename)
+    else:
+        tree = ast.Module(body=[], type_ignores=[])
+
+    argparse_visitor = ArgparseVisitor()
+    argparse_visitor.visit(tree)
+    root, prog = argparse_visitor.root()
+    if root is None:
+        click_visitor = ClickVisitor()
+        click_visitor.visit(tree)
+        root = click_visitor.root()
+    if root is None:
+        raise CompletionsLoadError(
+            'No argparse parser or click command found in %r.' % filename)
+
+    if not name:
+        name = path.splitext(path.basename(filename))[0]
+        if name == '__main__':
+            name = path.basename(path.dirname(path.abspath(filename)))
+        name = prog or name
+    return {
+        'program': {
+            'name': name,
+            'desc': root['desc'],
+            'options': root['options'],
+        },
+        # options of the parent commands go before the subcommands
+        'inherit': False,
+        'commands': root['commands'],
+    }
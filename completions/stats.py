@@ -0,0 +1,82 @@
+"""
+Summarize the completion requests traced by the generated scripts
+
+With `$COMPLETIONS_TRACE` set to a file, the generated scripts append a line
+to it for each completion request, with the fields separated by tabs: the
+time, the shell, the program, the command path, the number of candidates
+and the elapsed microseconds.
+"""
+from collections import OrderedDict
+
+FIELDS = ('time', 'shell', 'program', 'command', 'candidates', 'elapsed')
+PERCENTS = (50, 90, 99)
+
+
+def read_traces(tracefiles):
+    """Read the requests from the trace files, skip the broken lines
+
+    The lines written by the shells at the same time may be interleaved.
+    """
+    for tracefile in tracefiles:
+        with open(tracefile) as ftrace:
+            for line in ftrace:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) != len(FIELDS):
+                    continue
+                try:
+                    yield dict(zip(FIELDS, fields),
+                               candidates=int(fields[4]),
+                               elapsed=int(fields[5]))
+                except ValueError:
+                    continue
+
+
+def percentile(values, percent):
+    """The given percentile of the sorted values"""
+    return values[min(len(values) - 1, int(len(values) * percent / 100.0))]
+
+
+def summarize(requests):
+    """The latencies of the requests of each program and command
+
+    Returns a dict keyed by the program and the command path, sorted, with
+    the number of requests, the shells, the number of the requests without
+    candidates (left to the file completion of the shell), and the
+    percentiles and the maximum of the elapsed time in milliseconds.
+    """
+    groups = {}
+    for request in requests:
+        group = groups.setdefault((request['program'], request['command']),
+                                  dict(elapsed=[], shells=set(), empty=0))
+        group['elapsed'].append(request['elapsed'] / 1000.0)
+        group['shells'].add(request['shell'])
+        group['empty'] += not request['candidates']
+
+    summary = OrderedDict()
+    for key in sorted(groups):
+        elapsed = sorted(groups[key]['elapsed'])
+        summary[key] = dict(requests=len(elapsed),
+                            shells=sorted(groups[key]['shells']),
+                            empty=groups[key]['empty'],
+                            max=elapsed[-1])
+        for percent in PERCENTS:
+            summary[key]['p%d' % percent] = percentile(elapsed, percent)
+    return summary
+
+
+def format_summary(summary):
+    """Format the summary as a table, yield the lines"""
+    header = (['program', 'command', 'shells', 'requests', 'empty'] +
+              ['p%d(ms)' % percent for percent in PERCENTS] + ['max(ms)'])
+    rows = [header]
+    for (program, command), stats in summary.items():
+        rows.append([program, command or '-', ','.join(stats['shells']),
+                     str(stats['requests']), str(stats['empty'])] +
+                    ['%.2f' % stats['p%d' % percent] for percent in PERCENTS] +
+                    ['%.2f' % stats['max']])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    for row in rows:
+        # text left aligned, numbers right aligned
+        yield '  '.join(
+            cell.ljust(width) if i < 3 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))).rstrip()
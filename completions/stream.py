@@ -0,0 +1,65 @@
+"""
+Read the records of a spec streamed, one at a time
+
+For the specs too large to be held in memory as a whole while loaded, the
+spec is given as records, read and loaded one by one, from:
+- NDJSON (`.ndjson` or `.jsonl`): a JSON object on each line;
+- YAML streams, starting with `---`: a YAML document for each record.
+
+A record has any of the top-level keys of a configuration file: `program`
+(its name, desc and options), `inherit` and `commands`, or is a command,
+given by `command`, its path joined by spaces, with its `desc`, `options`
+and `commands`:
+
+    {"program": {"name": "prog", "desc": "A program.", "options": {}}}
+    {"command": "get", "desc": "Get resources.", "options": {"-o": "Out."}}
+    {"command": "get pods", "desc": "Get pods.", "options": {}}
+
+See `Completions.load_records()` for how they are loaded.
+"""
+from os import path
+
+from completions import CompletionsLoadError
+
+NDJSON_EXTS = ('.ndjson', '.jsonl')
+YAML_EXTS = ('.yaml', '.yml')
+
+
+def is_stream(filename):
+    """If a file is to be read as a stream of records"""
+    if filename.endswith(NDJSON_EXTS):
+        return True
+    if not filename.endswith(YAML_EXTS):
+        return False
+    with open(filename) as fstream:
+        return fstream.readline().startswith('---')
+
+
+def ndjson_records(fileobj, filename='<stream>'):
+    """The records of NDJSON, the blank lines skipped"""
+    import json
+    for lineno, line in enumerate(fileobj, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            raise CompletionsLoadError('Line %s of %r: %s' %
+                                       (lineno, filename, exc)) from None
+
+
+def yaml_records(fileobj):
+    """The records of a YAML stream, the empty documents skipped"""
+    import yaml
+    # the same loader as python-simpleconf, in C if available
+    loader = getattr(yaml, 'CLoader', yaml.Loader)
+    for record in yaml.load_all(fileobj, Loader=loader):
+        if record is not None:
+            yield record
+
+
+def read_records(fileobj, filename):
+    """The records of a file, by its extension"""
+    if path.basename(filename).endswith(NDJSON_EXTS):
+        return ndjson_records(fileobj, filename)
+    return yaml_records(fileobj)
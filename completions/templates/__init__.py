@@ -0,0 +1,267 @@
+"""Templates for each shell completion file
+
+The templates of each shell are in its own module, with the `assemble_*`
+functions yielding the code in chunks, so that a large completion file can
+be written out without being held in memory. Here are the parts shared by
+the shells, and the minifying of the templates.
+"""
+import re
+from collections.abc import Iterator
+from functools import lru_cache
+from shlex import quote as _sh_quote
+from string import Formatter
+
+# Refresh the cache file ($2) of option values with the output of the
+# provider ($1), waiting no longer than the timeout ($3, in milliseconds).
+# With an index ($4 is 1), the values are sorted to $2.index, and only the
+# time is written to the cache file. A lock left by a refresh killed before
+# removing it, by SIGKILL or a reboot, expires after a minute, not to keep
+# the values stale for good.
+# Shared by all shells, run by `sh -c`, and quoted by single quotes.
+VALUES_REFRESH = """
+mkdir -p "${2%/*}" || exit
+find "$2.lock" -prune -mmin +1 -exec rmdir {} \\; 2>/dev/null
+(
+    mkdir "$2.lock" 2>/dev/null || exit 0
+    trap "rm -f \\"$2.tmp\\" \\"$2.index.tmp\\"; rmdir \\"$2.lock\\"" EXIT
+    if [ "$4" = 1 ]; then
+        eval "$1" > "$2.index.tmp" &&
+            LC_ALL=C sort -u -o "$2.index.tmp" "$2.index.tmp" &&
+            mv -f "$2.index.tmp" "$2.index" &&
+            date +%s > "$2.tmp" && mv -f "$2.tmp" "$2"
+    else
+        { date +%s && eval "$1"; } > "$2.tmp" && mv -f "$2.tmp" "$2"
+    fi
+) </dev/null >/dev/null 2>&1 &
+n=$(( $3 / 50 ))
+while [ $n -gt 0 ] && kill -0 $! 2>/dev/null; do
+    sleep 0.05
+    n=$(( n - 1 ))
+done
+"""
+
+# Print the values in the sorted index ($1) starting with the prefix ($2),
+# found by the binary search of look, or by awk reading the index up to the
+# last of them if look is not installed. Quoted the same as VALUES_REFRESH.
+VALUES_LOOK = """
+export LC_ALL=C prefix="$2"
+[ -n "$2" ] || exec cat "$1"
+command -v look >/dev/null 2>&1 && exec look -- "$2" "$1"
+exec awk "index(\\$0, ENVIRON[\\"prefix\\"]) == 1 { print; found = 1; next }
+    found { exit }" "$1"
+"""
+
+# the tables of the providers by their indexes, the same for bash and zsh,
+# followed by the options overriding the global ones, if any
+VALUES_TABLES = """{complete_function}_vkeys=({keys})
+{complete_function}_vttls=({ttls})
+{complete_function}_vtimeouts=({timeouts})
+{complete_function}_vcmds=({provider_commands})
+{complete_function}_vindexed=({indexed})
+{overridden}"""
+
+# the names derived from the function completing, shortened when minified
+MINIFIED_NAMES = dict(
+    com_='m_', command='cm', coms='cs', coms_='c_', describe='ds', descs='d',
+    gopts='g', gopts_='g_', index='i', lazy='z', line='ln', look='lk',
+    opts='os', opts_='o_', refresh='r', subcoms='s', trace='t', tracing='tg',
+    using='u', values='v', vcmds='vc', vindex='vi', vindexed='vx',
+    vkeys='vk', voverridden='vr', vtimeouts='vo', vttls='vt')
+
+# `_opts_` of `{complete_function}_opts_{index}` is a name on its own
+DERIVED_NAME = re.compile(r'\{(complete_function|no_command_function)\}'
+                          r'_([A-Za-z]+(?:_[A-Za-z]+)*_?)')
+
+
+@lru_cache(maxsize=None)
+def _shorten(template):
+    """Shorten the names derived from the function completing"""
+    return DERIVED_NAME.sub(
+        lambda match: '{%s}%s' % (match.group(1), MINIFIED_NAMES.get(
+            match.group(2), '_' + match.group(2))), template)
+
+
+@lru_cache(maxsize=None)
+def _minify(template):
+    """Minify a template of whole lines
+
+    The indentation, the comments, the blank lines and the line
+    continuations are removed, and the names shortened. A template starting
+    or ending with a newline still does, as it is put next to others.
+    """
+    lines = []
+    continued = False
+    for line in template.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#') and not line.startswith(
+                '#compdef'):
+            continue
+        if continued:
+            lines[-1] += line
+        else:
+            lines.append(line)
+        continued = line.endswith('\\')
+        if continued:
+            lines[-1] = lines[-1][:-1].rstrip() + ' '
+    return _shorten(('\n' if template.startswith('\n') else '') +
+                    '\n'.join(lines) +
+                    ('\n' if template.endswith('\n') else ''))
+
+
+def _template(template, minify=False):
+    """A template of whole lines, minified if asked"""
+    return _minify(template) if minify else template
+
+
+def _fragment(template, minify=False):
+    """A template put within a line, only the names shortened if minified"""
+    return _shorten(template) if minify else template
+
+
+def _render(template, **fields):
+    """Render a template chunk by chunk
+
+    A field given as an iterator yields its lines one by one, joined by
+    newlines, so that a large block is never held as a whole in memory.
+    """
+    formatter = Formatter()
+    for literal, field, spec, conversion in formatter.parse(template):
+        if literal:
+            yield literal
+        if field is None:
+            continue
+        value = fields[field]
+        if isinstance(value, Iterator):
+            for i, line in enumerate(value):
+                if i:
+                    yield '\n'
+                yield line
+        else:
+            yield formatter.format_field(
+                formatter.convert_field(value, conversion), spec)
+
+
+def _command_paths(commands, parent=()):
+    """Walk down the command tree, yield the path and the command itself"""
+    for comname, command in commands.items():
+        compath = parent + (comname, )
+        yield compath, command
+        for subpath, subcommand in _command_paths(command.commands, compath):
+            yield subpath, subcommand
+
+
+def _value_tables(providers, commands=None, inherit=True):
+    """Collect the option value providers
+
+    Returns the unique providers, the lookup key (the path of the command
+    and the option, joined by space) with the index of the provider, and,
+    if the global options are inherited, the keys of the options overriding
+    a global one with values, without values of their own, which are not to
+    be looked up as the global one. To be collected once for a script, and
+    passed to `_values_block()` and `_values_lookup()`.
+    """
+    unique = []
+    # the index of each provider by its ident, not to scan the unique ones
+    indexes = {}
+    lookup = []
+    overridden = []
+    def add(key, provider):
+        index = indexes.get(provider.ident)
+        if index is None:
+            index = indexes[provider.ident] = len(unique)
+            unique.append(provider)
+        lookup.append((key, index))
+
+    for option, provider in (providers or {}).items():
+        add(option, provider)
+    for compath, command in _command_paths(commands or {}):
+        for option, provider in command.providers.items():
+            add(' '.join(compath + (option, )), provider)
+        if inherit and providers:
+            overridden.extend(' '.join(compath + (option, ))
+                              for option in command.options
+                              if option in providers
+                              and option not in command.providers)
+    return unique, lookup, overridden
+
+
+def _values_block(template, # pylint: disable=too-many-arguments
+                  name,
+                  complete_function,
+                  tables,
+                  start=0,
+                  quote=_sh_quote,
+                  entry="    [{key!r}]={index}",
+                  prefix='',
+                  overridden='',
+                  minify=False):
+    """Assemble the tables and the function serving option values
+
+    `tables` are the ones collected by `_value_tables()`. `overridden` is the
+    template of the table of the options overriding the global ones, put
+    only if any.
+    """
+    unique, lookup, overridden_keys = tables
+    if not unique:
+        return ''
+    entry = _template(entry, minify)
+    return _template(template, minify).format(
+        name=name,
+        complete_function=complete_function,
+        no_command_function=complete_function,
+        value_block='\n'.join(
+            entry.format(key=prefix + key, index=index + start)
+            for key, index in lookup),
+        keys=' '.join('values/' + provider.key for provider in unique),
+        ttls=' '.join(str(provider.ttl) for provider in unique),
+        timeouts=' '.join(
+            str(int(provider.timeout * 1000)) for provider in unique),
+        provider_commands=' '.join(
+            quote(provider.shell) for provider in unique),
+        indexed=' '.join(str(int(provider.index)) for provider in unique),
+        overridden=_template(overridden, minify).format(
+            complete_function=complete_function,
+            overridden_block='\n'.join(
+                entry.format(key=prefix + key, index=1)
+                for key in overridden_keys)) if overridden_keys else '',
+        refresh=_template(VALUES_REFRESH, minify),
+        look=_template(VALUES_LOOK, minify))
+
+
+def _values_lookup(template, # pylint: disable=too-many-arguments
+                   complete_function,
+                   tables,
+                   key,
+                   fallback='',
+                   minify=False):
+    """Assemble the code to complete the value of an option
+
+    `fallback` is the code to look up the global option instead, if the
+    option is not found for the command, when the global ones inherited.
+    """
+    if not tables[0]:
+        return ''
+    return _template(template, minify).format(
+        complete_function=complete_function,
+        key=key,
+        fallback=fallback)
+
+
+def _descriptions(options, commands=None):
+    """The descriptions of the options and the commands, walking down"""
+    for desc in options.values():
+        yield desc
+    for _, command in _command_paths(commands or {}):
+        yield command.desc
+        for desc in command.options.values():
+            yield desc
+
+
+def _descs_block(template, function, descs, quote, minify=False):
+    """Assemble the table of the descriptions stored once, if any"""
+    if not descs:
+        return ''
+    return _template(template, minify).format(
+        complete_function=function,
+        no_command_function=function,
+        descs=' '.join(quote(desc) for desc in descs))
@@ -0,0 +1,561 @@
+"""Templates of the bash completion files"""
+from itertools import chain
+from shlex import quote as _sh_quote
+
+from completions.templates import (VALUES_REFRESH, VALUES_LOOK, VALUES_TABLES,
+                                   _template, _fragment, _render,
+                                   _command_paths, _value_tables,
+                                   _values_block, _values_lookup)
+
+BASH_INSTALL_COMPLETION = """
+# in case is not defined
+if [[ $(type -t _get_comp_words_by_ref) == "" ]]; then
+    echo "[completions] bash-completion is not installed. Install it first."
+    return 1
+fi
+"""
+
+BASH_TRACE = """
+# with $COMPLETIONS_TRACE set, each completion request appends a line to the
+# file: the time, the shell, the program, the command, the number of
+# candidates and the elapsed microseconds. See `completions stats`.
+{complete_function}_trace() {{
+    local now=${{EPOCHREALTIME//[!0-9]/}}
+    # bash 5+
+    [[ -n $now && -n $2 ]] || return 0
+    printf '%s\\tbash\\t%s\\t%s\\t%s\\t%s\\n' "${{now:0:-6}}" {program} "$1" \\
+        ${{#COMPREPLY[@]}} $(( now - ${{2//[!0-9]/}} )) >> "$COMPLETIONS_TRACE"
+}}
+"""
+
+BASH_VALUES = """
+# option values from providers, cached per user and refreshed when stale,
+# the first line of a cache file is the time it was written
+declare -gA {complete_function}_vindex=(
+{value_block}
+)
+""" + VALUES_TABLES + """{complete_function}_refresh='{refresh}'
+{complete_function}_look='{look}'
+
+{complete_function}_values() {{
+    local sock cache now
+
+    # ask the daemon (completions serve) first, if it is running as the
+    # user, not on a socket anyone else could have put in /tmp
+    sock=${{COMPLETIONS_SOCKET:-${{XDG_RUNTIME_DIR:-/tmp}}/completions-$USER.sock}}
+    if [[ -S $sock && -O $sock ]] && hash nc 2>/dev/null; then
+        mapfile -t values < <(
+            IFS=$'\\t'
+            printf '%s\\t%s\\n' {name!r} "${{words[*]:1:cword}}" |
+                nc -U "$sock" 2>/dev/null)
+        # answered if ended by an empty line
+        if (( ${{#values[@]}} )) && [[ -z ${{values[-1]}} ]]; then
+            unset 'values[-1]'
+            return
+        fi
+    fi
+
+    cache=${{XDG_CACHE_HOME:-$HOME/.cache}}/completions/${{{complete_function}_vkeys[$1]}}
+    printf -v now '%(%s)T' -1
+    values=()
+    [[ -r $cache ]] && mapfile -t values < "$cache"
+    if (( ${{#values[@]}} == 0 ||
+          values[0] + {complete_function}_vttls[$1] < now )); then
+        sh -c "${complete_function}_refresh" sh \\
+            "${{{complete_function}_vcmds[$1]}}" "$cache" \\
+            "${{{complete_function}_vtimeouts[$1]}}" \\
+            "${{{complete_function}_vindexed[$1]}}"
+        [[ -r $cache ]] && mapfile -t values < "$cache"
+    fi
+    if (( {complete_function}_vindexed[$1] )); then
+        # only the values starting with the word, from the index
+        values=()
+        [[ -r $cache.index ]] && mapfile -t values < <(
+            sh -c "${complete_function}_look" sh "$cache.index" "$cur")
+        return
+    fi
+    values=("${{values[@]:1}}")
+}}
+"""
+
+# the options of the commands overriding the global ones with values, without
+# values of their own, not to complete the values of the global ones
+BASH_VALUES_OVERRIDDEN = """declare -gA {complete_function}_voverridden=(
+{overridden_block}
+)
+"""
+
+BASH_VALUES_LOOKUP = """
+    # completing for the value of an option
+    word=${{words[cword-1]}}
+    local key="{key}"
+{fallback}
+    if [[ $word == -* &&
+          -n ${{{complete_function}_vindex[$key]+x}} ]]; then
+        local values
+        {complete_function}_values "${{{complete_function}_vindex[$key]}}"
+        for word in "${{values[@]}}"; do
+            [[ $word == "$cur"* ]] && COMPREPLY+=("$word")
+        done
+        [[ -n $COMPLETIONS_TRACE ]] && {complete_function}_trace "$com" "$start"
+        return 0
+    fi
+"""
+
+BASH_WITH_COMMANDS = BASH_INSTALL_COMPLETION + """
+# associative arrays need bash 4.2+
+if (( BASH_VERSINFO[0] * 100 + BASH_VERSINFO[1] < 402 )); then
+    echo "[completions] bash 4.2+ is required."
+    return 1
+fi
+
+# lookup tables, built once when this file is sourced, keyed by the
+# space-joined path of each command
+{complete_function}_gopts={global_options}
+{complete_function}_coms={commands}
+declare -gA {complete_function}_opts=(
+{command_block}
+)
+declare -gA {complete_function}_subcoms=(
+{subcommand_block}
+)
+{values_block}{trace_block}
+{complete_function}() {{
+    local cur words cword script word com opts start
+    COMPREPLY=()
+    # timed if traced
+    [[ -n $COMPLETIONS_TRACE ]] && start=$EPOCHREALTIME
+    _get_comp_words_by_ref -n : cur words cword
+
+    # for an alias, get the real script behind it
+    script=${{BASH_ALIASES[${{words[0]}}]:-${{words[0]}}}}
+    script=${{script%% *}}
+
+    # walk down the command tree, one lookup for each word typed
+    for word in "${{words[@]:1:cword-1}}"; do
+        [[ -z $word || $word == -* ]] && continue
+        if [[ -n ${{{complete_function}_opts[${{com:+$com }}$word]+x}} ]]; then
+            com="${{com:+$com }}$word"
+        fi
+    done
+{values_lookup}
+    if [[ $cur == -* ]]; then
+        # completing for an option
+        if [[ -z $com ]]; then
+            opts=${{{complete_function}_gopts}}
+        else
+            opts="{inherited}${{{complete_function}_opts[$com]}}"
+        fi
+    elif [[ -n $com ]]; then
+        # completing for a subcommand
+        opts=${{{complete_function}_subcoms[$com]}}
+    else
+        # completing for a command
+        opts=${{{complete_function}_coms}}
+    fi
+
+    # filter in the shell itself, compgen in $(...) would fork
+    for word in $opts; do
+        [[ $word == "$cur"* ]] && COMPREPLY+=("$word")
+    done
+    __ltrim_colon_completions "$cur"
+
+    [[ -n $COMPLETIONS_TRACE ]] && {complete_function}_trace "$com" "$start"
+    return 0
+}}
+
+{exclude_block}
+"""
+
+BASH_WITH_COMMANDS_COMMAND = "    [{command!r}]={options!r}"
+
+BASH_EXECUTE = "complete -o default -F {complete_function!r} {name!r}"
+
+BASH_WITHOUT_COMMANDS = BASH_INSTALL_COMPLETION + """
+{values_block}{trace_block}
+{complete_function}() {{
+    local cur words cword script word com opts start
+    COMPREPLY=()
+    # timed if traced
+    [[ -n $COMPLETIONS_TRACE ]] && start=$EPOCHREALTIME
+    _get_comp_words_by_ref -n : cur words cword
+
+    # for an alias, get the real script behind it
+    script=${{BASH_ALIASES[${{words[0]}}]:-${{words[0]}}}}
+    script=${{script%% *}}
+{values_lookup}
+    # completing for an option
+    if [[ $cur == -* ]]; then
+        opts="{options}"
+
+        for word in $opts; do
+            [[ $word == "$cur"* ]] && COMPREPLY+=("$word")
+        done
+        __ltrim_colon_completions "$cur"
+    fi
+
+    [[ -n $COMPLETIONS_TRACE ]] && {complete_function}_trace "$com" "$start"
+    return 0
+}}
+
+{exclude_block}
+"""
+
+BASH_STUB = """
+# completions for {name} are loaded on the first TAB
+{complete_function}_lazy() {{
+    unset -f {complete_function}_lazy
+    . {script!r} && {complete_function} "$@"
+}}
+
+{exclude_block}
+"""
+
+BASH_BUNDLE = BASH_INSTALL_COMPLETION + """
+# associative arrays need bash 4.2+
+if (( BASH_VERSINFO[0] * 100 + BASH_VERSINFO[1] < 402 )); then
+    echo "[completions] bash 4.2+ is required."
+    return 1
+fi
+
+# the runtime shared by the programs bundled, the tables are keyed by the
+# name of the program, followed by the path of the command, so that the
+# programs of other bundles sourced are added to them as well
+declare -gA _completions_bundle_progs _completions_bundle_gopts \\
+    _completions_bundle_coms _completions_bundle_opts \\
+    _completions_bundle_subcoms _completions_bundle_inherit \\
+    _completions_bundle_vindex _completions_bundle_vbase \\
+    _completions_bundle_voverridden
+declare -ga _completions_bundle_vkeys _completions_bundle_vttls \\
+    _completions_bundle_vtimeouts _completions_bundle_vcmds \\
+    _completions_bundle_vindexed
+_completions_bundle_refresh='{refresh}'
+_completions_bundle_look='{look}'
+
+# option values from providers, cached per user and refreshed when stale,
+# the first line of a cache file is the time it was written
+_completions_bundle_values() {{
+    local sock cache now
+
+    # ask the daemon (completions serve) first, if it is running as the
+    # user, not on a socket anyone else could have put in /tmp
+    sock=${{COMPLETIONS_SOCKET:-${{XDG_RUNTIME_DIR:-/tmp}}/completions-$USER.sock}}
+    if [[ -S $sock && -O $sock ]] && hash nc 2>/dev/null; then
+        mapfile -t values < <(
+            IFS=$'\\t'
+            printf '%s\\t%s\\n' "$prog" "${{words[*]:1:cword}}" |
+                nc -U "$sock" 2>/dev/null)
+        # answered if ended by an empty line
+        if (( ${{#values[@]}} )) && [[ -z ${{values[-1]}} ]]; then
+            unset 'values[-1]'
+            return
+        fi
+    fi
+
+    cache=${{XDG_CACHE_HOME:-$HOME/.cache}}/completions/${{_completions_bundle_vkeys[$1]}}
+    printf -v now '%(%s)T' -1
+    values=()
+    [[ -r $cache ]] && mapfile -t values < "$cache"
+    if (( ${{#values[@]}} == 0 ||
+          values[0] + _completions_bundle_vttls[$1] < now )); then
+        sh -c "$_completions_bundle_refresh" sh \\
+            "${{_completions_bundle_vcmds[$1]}}" "$cache" \\
+            "${{_completions_bundle_vtimeouts[$1]}}" \\
+            "${{_completions_bundle_vindexed[$1]}}"
+        [[ -r $cache ]] && mapfile -t values < "$cache"
+    fi
+    if (( _completions_bundle_vindexed[$1] )); then
+        # only the values starting with the word, from the index
+        values=()
+        [[ -r $cache.index ]] && mapfile -t values < <(
+            sh -c "$_completions_bundle_look" sh "$cache.index" "$cur")
+        return
+    fi
+    values=("${{values[@]:1}}")
+}}
+{trace_block}
+_completions_bundle_complete() {{
+    local cur words cword word com opts prog key start
+    COMPREPLY=()
+    # timed if traced
+    [[ -n $COMPLETIONS_TRACE ]] && start=$EPOCHREALTIME
+    _get_comp_words_by_ref -n : cur words cword
+
+    prog=${{_completions_bundle_progs[$1]}}
+    [[ -n $prog ]] || return 0
+
+    # walk down the command tree, one lookup for each word typed
+    for word in "${{words[@]:1:cword-1}}"; do
+        [[ -z $word || $word == -* ]] && continue
+        if [[ -n ${{_completions_bundle_opts[$prog ${{com:+$com }}$word]+x}} ]]; then
+            com="${{com:+$com }}$word"
+        fi
+    done
+
+    # completing for the value of an option
+    word=${{words[cword-1]}}
+    key="$prog ${{com:+$com }}$word"
+    if [[ -n ${{_completions_bundle_inherit[$prog]}} &&
+          -z ${{_completions_bundle_vindex[$key]+x}} &&
+          -z ${{_completions_bundle_voverridden[$key]+x}} ]]; then
+        key="$prog $word"
+    fi
+    if [[ $word == -* && -n ${{_completions_bundle_vindex[$key]+x}} ]]; then
+        local values
+        _completions_bundle_values $((
+            _completions_bundle_vbase[$prog] +
+            _completions_bundle_vindex[$key] ))
+        for word in "${{values[@]}}"; do
+            [[ $word == "$cur"* ]] && COMPREPLY+=("$word")
+        done
+        [[ -n $COMPLETIONS_TRACE ]] && _completions_bundle_trace "$com" "$start"
+        return 0
+    fi
+
+    if [[ $cur == -* ]]; then
+        # completing for an option
+        opts=${{_completions_bundle_opts[$prog $com]}}
+        if [[ -z $com || -n ${{_completions_bundle_inherit[$prog]}} ]]; then
+            opts="${{_completions_bundle_gopts[$prog]}} $opts"
+        fi
+    elif [[ -n $com ]]; then
+        # completing for a subcommand
+        opts=${{_completions_bundle_subcoms[$prog $com]}}
+    else
+        # completing for a command
+        opts=${{_completions_bundle_coms[$prog]}}
+    fi
+
+    # filter in the shell itself, compgen in $(...) would fork
+    for word in $opts; do
+        [[ $word == "$cur"* ]] && COMPREPLY+=("$word")
+    done
+    __ltrim_colon_completions "$cur"
+
+    [[ -n $COMPLETIONS_TRACE ]] && _completions_bundle_trace "$com" "$start"
+    return 0
+}}
+"""
+
+BASH_BUNDLE_PROGRAM = """
+# {name}
+_completions_bundle_gopts[{name!r}]={global_options}
+_completions_bundle_coms[{name!r}]={commands}
+_completions_bundle_inherit[{name!r}]={inherit}
+_completions_bundle_opts+=(
+{command_block}
+)
+_completions_bundle_subcoms+=(
+{subcommand_block}
+)
+{values_block}{exclude_block}"""
+
+BASH_BUNDLE_VALUES = """
+_completions_bundle_vbase[{name!r}]=${{#_completions_bundle_vkeys[@]}}
+_completions_bundle_vindex+=(
+{value_block}
+)
+_completions_bundle_vkeys+=({keys})
+_completions_bundle_vttls+=({ttls})
+_completions_bundle_vtimeouts+=({timeouts})
+_completions_bundle_vcmds+=({provider_commands})
+_completions_bundle_vindexed+=({indexed})
+{overridden}"""
+
+BASH_BUNDLE_OVERRIDDEN = """_completions_bundle_voverridden+=(
+{overridden_block}
+)
+"""
+
+BASH_BUNDLE_EXECUTE = ("_completions_bundle_progs[{command!r}]={name!r}\n"
+                       "complete -o default -F _completions_bundle_complete "
+                       "{command!r}")
+
+# the global options for the commands, when inherited
+BASH_INHERITED = "${{{complete_function}_gopts}} "
+BASH_VALUES_FALLBACK = (
+    "    [[ -n ${{{complete_function}_vindex[$key]+x}} ]] || key=$word")
+# unless overridden by the command, if any command does
+BASH_VALUES_FALLBACK_OVERRIDDEN = (
+    "    [[ -n ${{{complete_function}_vindex[$key]+x}} ||\n"
+    "          -n ${{{complete_function}_voverridden[$key]+x}} ]] || key=$word")
+
+
+def assemble_bash_stub(name, # pylint: disable=too-many-arguments
+                       complete_function,
+                       script,
+                       fullpath=None,
+                       minify=False):
+    """Assemble a bash stub that sources the full script on the first TAB"""
+    lazy_function = _fragment('{complete_function}_lazy', minify).format(
+        complete_function=complete_function)
+    exclude_block = [
+        BASH_EXECUTE.format(complete_function=lazy_function, name=name)
+    ]
+    if fullpath:
+        exclude_block.append(
+            BASH_EXECUTE.format(complete_function=lazy_function,
+                                name=fullpath))
+    return _template(BASH_STUB, minify).format(
+        name=name,
+        complete_function=complete_function,
+        script=script,
+        exclude_block='\n'.join(exclude_block))
+
+
+def _bash_options(command, global_options, inherit=True):
+    """The options of a command, to be completed after the global ones
+
+    Inherited, the global options are completed for the command already,
+    including the ones it overrides, which are not to be repeated. Only the
+    names are completed by bash.
+    """
+    return ' '.join(option for option in command.options
+                    if not inherit or option not in global_options)
+
+
+def assemble_bash_with_commands(name, # pylint: disable=too-many-arguments
+                                complete_function,
+                                global_options,
+                                commands,
+                                fullpath=None,
+                                providers=None,
+                                inherit=True,
+                                minify=False):
+    """Assemble bash completions with commands
+
+    The options and the subcommands of each command are put into
+    associative arrays keyed by the path of the command when the file is
+    sourced, so that a completion request only does a lookup for each word.
+    The global options are put once, and added to the ones of the command
+    being completed if inherited. With `minify`, the code is put without
+    the indentation and the comments, and with shorter names.
+    """
+    tables = _value_tables(providers, commands, inherit)
+    entry = _template(BASH_WITH_COMMANDS_COMMAND, minify)
+    command_block = (
+        entry.format(command=' '.join(compath),
+                     options=_bash_options(command, global_options, inherit))
+        for compath, command in _command_paths(commands))
+    subcommand_block = (
+        entry.format(command=' '.join(compath),
+                     options=' '.join(command.commands.keys()))
+        for compath, command in _command_paths(commands)
+        if command.commands)
+    exclude_block = [
+        BASH_EXECUTE.format(complete_function=complete_function, name=name)
+    ]
+    if fullpath:
+        exclude_block.append(
+            BASH_EXECUTE.format(complete_function=complete_function,
+                                name=fullpath))
+
+    return _render(
+        _template(BASH_WITH_COMMANDS, minify),
+        complete_function=complete_function,
+        trace_block=_template(BASH_TRACE, minify).format(
+            complete_function=complete_function, program=_sh_quote(name)),
+        global_options=repr(' '.join(global_options.keys())),
+        command_block=command_block,
+        subcommand_block=subcommand_block,
+        values_block=_values_block(BASH_VALUES, name, complete_function,
+                                   tables, overridden=BASH_VALUES_OVERRIDDEN,
+                                   minify=minify),
+        values_lookup=_values_lookup(
+            BASH_VALUES_LOOKUP, complete_function, tables,
+            '${com:+$com }$word',
+            _template(
+                BASH_VALUES_FALLBACK_OVERRIDDEN if tables[2] else
+                BASH_VALUES_FALLBACK, minify).format(
+                    complete_function=complete_function) if inherit else '',
+            minify),
+        inherited=_fragment(BASH_INHERITED, minify).format(
+            complete_function=complete_function) if inherit else '',
+        commands=repr(' '.join(commands.keys())),
+        exclude_block='\n'.join(exclude_block))
+
+
+def assemble_bash_without_commands(name, # pylint: disable=too-many-arguments
+                                   complete_function,
+                                   options,
+                                   fullpath=None,
+                                   providers=None,
+                                   minify=False):
+    """Assemble bash completions without commands"""
+    tables = _value_tables(providers)
+    exclude_block = [
+        BASH_EXECUTE.format(complete_function=complete_function, name=name)
+    ]
+    if fullpath:
+        exclude_block.append(
+            BASH_EXECUTE.format(complete_function=complete_function,
+                                name=fullpath))
+    return _render(
+        _template(BASH_WITHOUT_COMMANDS, minify),
+        complete_function=complete_function,
+        trace_block=_template(BASH_TRACE, minify).format(
+            complete_function=complete_function, program=_sh_quote(name)),
+        options=' '.join(options.keys()),
+        values_block=_values_block(BASH_VALUES, name, complete_function,
+                                   tables, minify=minify),
+        values_lookup=_values_lookup(BASH_VALUES_LOOKUP, complete_function,
+                                     tables, '$word', minify=minify),
+        exclude_block='\n'.join(exclude_block))
+
+
+def _bash_bundle_program(name, # pylint: disable=too-many-arguments
+                         global_options,
+                         commands,
+                         fullpath=None,
+                         providers=None,
+                         inherit=True):
+    """Assemble the tables of a program in a bash bundle"""
+    command_block = (
+        BASH_WITH_COMMANDS_COMMAND.format(command=' '.join((name, ) + compath),
+                                          options=_bash_options(
+                                              command, global_options,
+                                              inherit))
+        for compath, command in _command_paths(commands))
+    subcommand_block = (
+        BASH_WITH_COMMANDS_COMMAND.format(command=' '.join((name, ) + compath),
+                                          options=' '.join(
+                                              command.commands.keys()))
+        for compath, command in _command_paths(commands)
+        if command.commands)
+    exclude_block = [
+        BASH_BUNDLE_EXECUTE.format(command=command, name=name)
+        for command in ((name, fullpath) if fullpath else (name, ))
+    ]
+    return _render(
+        BASH_BUNDLE_PROGRAM,
+        name=name,
+        global_options=repr(' '.join(global_options.keys())),
+        commands=repr(' '.join(commands.keys())),
+        inherit=1 if inherit else "''",
+        command_block=command_block,
+        subcommand_block=subcommand_block,
+        values_block=_values_block(BASH_BUNDLE_VALUES, name, None,
+                                   _value_tables(providers, commands,
+                                                 inherit),
+                                   prefix=name + ' ',
+                                   overridden=BASH_BUNDLE_OVERRIDDEN),
+        exclude_block='\n'.join(exclude_block))
+
+
+def assemble_bash_bundle(programs):
+    """Assemble the completions of many programs into one bash file
+
+    The runtime, the function completing and the one serving option values,
+    is put once, and each program only adds its tables to the ones of the
+    runtime. `programs` yields the name, the global options, the commands,
+    the full path, the providers and whether inherit for each program.
+    """
+    return chain(
+        _render(BASH_BUNDLE,
+                refresh=VALUES_REFRESH,
+                look=VALUES_LOOK,
+                trace_block=BASH_TRACE.format(
+                    complete_function='_completions_bundle',
+                    program='"$prog"')),
+        chain.from_iterable(
+            _bash_bundle_program(*program) for program in programs))
@@ -0,0 +1,354 @@
+"""Templates of the fish completion files"""
+from collections import Counter
+from itertools import chain
+
+from completions.templates import (_template, _fragment, _render,
+                                   _command_paths, _value_tables,
+                                   _values_block, _descriptions, _descs_block)
+
+FISH_VALUES = """
+# option values from providers, cached per user and refreshed when stale
+set -g {no_command_function}_vkeys {keys}
+set -g {no_command_function}_vttls {ttls}
+set -g {no_command_function}_vtimeouts {timeouts}
+set -g {no_command_function}_vcmds {provider_commands}
+set -g {no_command_function}_vindexed {indexed}
+set -g {no_command_function}_refresh '{refresh}'
+set -g {no_command_function}_look '{look}'
+
+function {no_command_function}_values
+    # ask the daemon (completions serve) first, if it is running as the
+    # user, not on a socket anyone else could have put in /tmp
+    set -l sock /tmp
+    set -q XDG_RUNTIME_DIR; and set sock $XDG_RUNTIME_DIR
+    set sock $sock/completions-$USER.sock
+    set -q COMPLETIONS_SOCKET; and set sock $COMPLETIONS_SOCKET
+    if test -S $sock; and test -O $sock; and command -q nc
+        set -l words (commandline -opc) (commandline -ct)
+        set words[1] {name}
+        set -l values (string join \\t -- $words | nc -U $sock 2>/dev/null)
+        # answered if ended by an empty line
+        if set -q values[1]; and test -z "$values[-1]"
+            set -e values[-1]
+            printf '%s\\n' $values
+            return
+        end
+    end
+
+    set -l cache ~/.cache
+    set -q XDG_CACHE_HOME; and set cache $XDG_CACHE_HOME
+    set cache $cache/completions/${no_command_function}_vkeys[$argv[1]]
+    set -l age (path mtime --relative -- $cache 2>/dev/null)
+    if test -z "$age"; or test $age -gt ${no_command_function}_vttls[$argv[1]]
+        sh -c ${no_command_function}_refresh sh \\
+            ${no_command_function}_vcmds[$argv[1]] $cache \\
+            ${no_command_function}_vtimeouts[$argv[1]] \\
+            ${no_command_function}_vindexed[$argv[1]]
+    end
+    if test ${no_command_function}_vindexed[$argv[1]] = 1
+        # only the values starting with the word, from the index
+        set -l cur (commandline -ct)
+        test -r $cache.index; or return
+        sh -c ${no_command_function}_look sh $cache.index "$cur"
+        return
+    end
+    test -r $cache; or return
+    set -l values (string split \\n < $cache)
+    set -e values[1]
+    printf '%s\\n' $values
+end
+"""
+
+FISH_TRACE = """
+# with $COMPLETIONS_TRACE set, each completion request appends a line to the
+# file: the time, the shell, the program, the command, the number of
+# candidates and the elapsed microseconds. See `completions stats`. Fish
+# completes by itself, so the commandline is completed once more to count
+# the candidates, which needs `date +%N` (GNU date) to be timed.
+function {no_command_function}_trace
+    set -q {no_command_function}_tracing; and return
+    set -g {no_command_function}_tracing 1
+    set -l line ${no_command_function}_line
+    set -l command ${no_command_function}_command
+    set -l count (count (complete -C "$line"))
+    set -l now (date +%s%6N)
+    # the nested completion may have cached another commandline
+    set -g {no_command_function}_line $line
+    set -g {no_command_function}_command $command
+    set -e {no_command_function}_tracing
+    string match -qr '^\\d+$' -- "$argv[1]"; or return
+    string match -qr '^\\d+$' -- "$now"; or return
+    printf '%s\\tfish\\t%s\\t%s\\t%s\\t%s\\n' (string sub -l 10 -- $now) \\
+        {program} "$command" $count (math $now - $argv[1]) >> $COMPLETIONS_TRACE
+end
+"""
+
+FISH_VALUES_OPTION = " -x -a '({no_command_function}_values {index})'"
+
+FISH_WITH_COMMANDS = """
+# commands are looked up by variable name, no need to scan the list
+for com in {commands}
+    set -g {no_command_function}_com_(string escape --style=var -- $com)
+end
+{values_block}{trace_block}{descs_block}
+# detect the command path once per completion request, all the conditions
+# below share the result cached for the current commandline
+function {no_command_function}_using
+    set -l line (commandline -pc)
+    if test "$line" != "${no_command_function}_line"
+        # timed if traced
+        set -q COMPLETIONS_TRACE; and set -l start (date +%s%6N)
+        set -g {no_command_function}_line $line
+        set -g {no_command_function}_command ''
+        set -l words (commandline -opc)
+        set -e words[1]
+        for word in $words
+            set -l key $word
+            if test -n "${no_command_function}_command"
+                set key "${no_command_function}_command $word"
+            end
+            if set -q {no_command_function}_com_(string escape --style=var -- $key)
+                set -g {no_command_function}_command $key
+            end
+        end
+        set -q COMPLETIONS_TRACE; and {no_command_function}_trace $start
+    end
+    # any of the command paths given, for the options shared by them
+    contains -- "${no_command_function}_command" $argv
+end
+
+# global options
+{global_option_block}
+
+# commands
+{command_block}
+
+# command options
+{command_option_block}
+"""
+
+# the global options are completed for the commands as well if inherited,
+# otherwise only for the program itself
+FISH_WITH_COMMANDS_GLOBAL_OPTION = ("complete -c {name!r}{condition} "
+                                    "-{optype} {option!r} -d {desc}")
+
+FISH_NOT_INHERITED = " -n '{no_command_function}_using \"\"'"
+# inherited, not for the commands completing their own ones instead
+FISH_OVERRIDDEN = ' -n "not {no_command_function}_using {compaths}"'
+
+FISH_WITH_COMMANDS_COMMAND = ("complete -c {name!r} -f "
+                              "-n {condition!r} "
+                              "-a {command!r} -d {desc}")
+
+FISH_WITH_COMMANDS_COMMAND_OPTION = ("complete -c {name!r} -A "
+                                     "-n {condition!r} "
+                                     "-{optype} {option!r} -d {desc}")
+
+FISH_WITHOUT_COMMANDS = """{values_block}{descs_block}
+{option_block}
+"""
+
+FISH_WITHOUT_COMMANDS_OPTION = ("complete -c {name!r} "
+                                "-{optype} {option!r} -d {desc}")
+
+# minified, the descriptions used more than once are stored once in a list
+# local to the file, which is expanded as the entries are added
+FISH_DESCS = """
+set -l {no_command_function}_descs {descs}
+"""
+
+FISH_DESC = '"${no_command_function}_descs[{index}]"'
+
+FISH_USING = "{no_command_function}_using {compaths}"
+
+
+def _option_style(option):
+    """
+    Tell the style of an option.
+    1. '-' or '--': naked   (a)
+    2. '--abc'    : long    (l)
+    3. 'abc'      : commnad (a)
+    4. '-abc'     : oldlong (o)
+    5. '-a'       : short   (s)
+    """
+    if option in ('-', '--'):
+        return 'a'
+    if option.startswith('--'):
+        return 'l'
+    if not option.startswith('-'):
+        return 'f -a'
+    if len(option) > 2:
+        return 'o'
+    return 's'
+
+
+def _fish_quote(string):
+    """Quote a string for fish"""
+    return "'%s'" % string.replace('\\', '\\\\').replace("'", "\\'")
+
+
+def _fish_desc_table(no_command_function, options, commands=None):
+    """The references to the descriptions to be stored once
+
+    The descriptions used more than once are referred to by their indexes
+    in the list of `FISH_DESCS`, unless they are shorter than the references.
+    """
+    table = {}
+    for desc, count in Counter(_descriptions(options, commands)).items():
+        ref = _fragment(FISH_DESC, True).format(
+            no_command_function=no_command_function, index=len(table) + 1)
+        if count > 1 and len(repr(desc)) > len(ref):
+            table[desc] = ref
+    return table
+
+
+def _fish_global_conditions(no_command_function, global_options, commands,
+                            inherit=True, minify=False):
+    """The conditions of the global options, by the options
+
+    Not inherited, they are completed for the program itself only. Inherited,
+    for the commands as well, except the ones overriding them.
+    """
+    if not inherit:
+        condition = _fragment(FISH_NOT_INHERITED, minify).format(
+            no_command_function=no_command_function)
+        return dict.fromkeys(global_options, condition)
+    overriding = {}
+    for compath, command in _command_paths(commands):
+        for option in command.options:
+            if option in global_options:
+                overriding.setdefault(option, []).append(' '.join(compath))
+    overridden = _fragment(FISH_OVERRIDDEN, minify)
+    return {
+        option: overridden.format(
+            no_command_function=no_command_function,
+            compaths=' '.join(repr(compath) for compath in compaths))
+        for option, compaths in overriding.items()
+    }
+
+
+def _fish_option_groups(commands, lookup):
+    """Group the options of the commands, for one line completing each group
+
+    The options are grouped by the name, the description and the index of
+    the values, with the paths of the commands as the members.
+    """
+    groups = {}
+    for compath, command in _command_paths(commands):
+        for option, desc in command.options.items():
+            groups.setdefault(
+                (option, desc, lookup.get(' '.join(compath + (option, )))),
+                []).append(' '.join(compath))
+    return groups
+
+
+def assemble_fish_with_commands(name, # pylint: disable=too-many-arguments
+                                no_command_function,
+                                global_options,
+                                commands,
+                                fullpath=None,  # pylint: disable=unused-argument
+                                providers=None,
+                                inherit=True,
+                                minify=False):
+    """Assemble fish completions with commands
+
+    The command path being completed is detected by one cached function call
+    per completion request, instead of a scan over the command line for each
+    completion entry. The global options are completed once for all the
+    commands if inherited, instead of repeated for each of them, and an
+    option shared by commands is completed by one entry for all of them.
+    With `minify`, the descriptions used more than once are stored once as
+    well.
+    """
+    tables = _value_tables(providers, commands)
+    lookup = dict(tables[1])
+    descs = (_fish_desc_table(no_command_function, global_options, commands)
+             if minify else {})
+    conditions = _fish_global_conditions(no_command_function, global_options,
+                                         commands, inherit, minify)
+    global_option_block = (
+        _template(FISH_WITH_COMMANDS_GLOBAL_OPTION, minify).format(
+            name=name,
+            condition=conditions.get(option, ''),
+            optype=_option_style(option),
+            option=(option.lstrip('-')
+                    if _option_style(option) != 'a' else option),
+            desc=descs.get(desc) or repr(desc)) +
+        _fish_values_option(no_command_function, lookup.get(option), minify)
+        for option, desc in global_options.items())
+    command_block = (
+        _template(FISH_WITH_COMMANDS_COMMAND, minify).format(
+            name=name,
+            condition=_fragment(FISH_USING, minify).format(
+                no_command_function=no_command_function,
+                compaths=repr(' '.join(compath[:-1]))),
+            command=compath[-1],
+            desc=descs.get(command.desc) or repr(command.desc))
+        for compath, command in _command_paths(commands))
+    command_option_block = (
+        _template(FISH_WITH_COMMANDS_COMMAND_OPTION, minify).format(
+            name=name,
+            condition=_fragment(FISH_USING, minify).format(
+                no_command_function=no_command_function,
+                compaths=' '.join(repr(compath) for compath in compaths)),
+            optype=_option_style(option),
+            option=(option.lstrip('-')
+                    if _option_style(option) != 'a' else option),
+            desc=descs.get(desc) or repr(desc)) +
+        _fish_values_option(no_command_function, index, minify)
+        for (option, desc, index), compaths in _fish_option_groups(
+            commands, lookup).items())
+    return _render(
+        _template(FISH_WITH_COMMANDS, minify),
+        no_command_function=no_command_function,
+        trace_block=_template(FISH_TRACE, minify).format(
+            no_command_function=no_command_function,
+            program=_fish_quote(name)),
+        values_block=_values_block(FISH_VALUES, name, no_command_function,
+                                   tables, 1, _fish_quote, minify=minify),
+        descs_block=_descs_block(FISH_DESCS, no_command_function, descs,
+                                 repr, minify),
+        global_option_block=global_option_block,
+        commands=' '.join(
+            repr(' '.join(compath))
+            for compath, _ in _command_paths(commands)),
+        command_block=command_block,
+        command_option_block=command_option_block,
+    )
+
+
+def assemble_fish_without_commands(name, # pylint: disable=too-many-arguments
+                                   no_command_function,
+                                   options,
+                                   fullpath=None,  # pylint: disable=unused-argument
+                                   providers=None,
+                                   minify=False):
+    """Assemble fish completions without commands"""
+    tables = _value_tables(providers)
+    lookup = dict(tables[1])
+    descs = _fish_desc_table(no_command_function, options) if minify else {}
+    option_block = (
+        _template(FISH_WITHOUT_COMMANDS_OPTION, minify).format(
+            name=name,
+            optype=_option_style(option),
+            option=(option.lstrip('-')
+                    if _option_style(option) != 'a' else option),
+            desc=descs.get(desc) or repr(desc)) +
+        _fish_values_option(no_command_function, lookup.get(option), minify)
+        for option, desc in options.items())
+    return _render(
+        _template(FISH_WITHOUT_COMMANDS, minify),
+        values_block=_values_block(FISH_VALUES, name, no_command_function,
+                                   tables, 1, _fish_quote, minify=minify),
+        descs_block=_descs_block(FISH_DESCS, no_command_function, descs,
+                                 repr, minify),
+        option_block=chain([] if minify else ['# ' + no_command_function],
+                           option_block))
+
+
+def _fish_values_option(no_command_function, index, minify=False):
+    """Complete the values of an option from its provider, if any"""
+    if index is None:
+        return ''
+    return _fragment(FISH_VALUES_OPTION, minify).format(
+        no_command_function=no_command_function, index=index + 1)
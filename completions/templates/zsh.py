@@ -0,0 +1,419 @@
+"""Templates of the zsh completion files"""
+import re
+from shlex import quote as _sh_quote
+
+from completions.templates import (VALUES_TABLES, _template, _fragment,
+                                   _render, _command_paths, _value_tables,
+                                   _values_block, _values_lookup,
+                                   _descriptions, _descs_block)
+
+ZSH_VALUES = """
+# option values from providers, cached per user and refreshed when stale,
+# the first line of a cache file is the time it was written
+typeset -gA {complete_function}_vindex
+{complete_function}_vindex=(
+{value_block}
+)
+typeset -ga {complete_function}_vkeys {complete_function}_vttls \\
+    {complete_function}_vtimeouts {complete_function}_vcmds \\
+    {complete_function}_vindexed
+""" + VALUES_TABLES + """typeset -g {complete_function}_refresh='{refresh}'
+typeset -g {complete_function}_look='{look}'
+
+{complete_function}_values() {{
+    local sock cache fd line answered
+    reply=()
+
+    # ask the daemon (completions serve) first, if it is running as the
+    # user, not on a socket anyone else could have put in /tmp
+    sock=${{COMPLETIONS_SOCKET:-${{XDG_RUNTIME_DIR:-/tmp}}/completions-$USER.sock}}
+    if [[ -S $sock && -O $sock ]] && zmodload zsh/net/socket 2>/dev/null &&
+            zsocket $sock 2>/dev/null; then
+        fd=$REPLY
+        print -r -u $fd -- {name!r}$'\\t'${{(pj:\\t:)words[2,CURRENT]}}
+        while IFS= read -r -u $fd line; do
+            # answered if ended by an empty line
+            [[ -n $line ]] || {{ answered=1; break; }}
+            reply+=("$line")
+        done
+        exec {{fd}}>&-
+        [[ -n $answered ]] && return
+        reply=()
+    fi
+
+    cache=${{XDG_CACHE_HOME:-$HOME/.cache}}/completions/${{{complete_function}_vkeys[$1]}}
+    zmodload -F zsh/datetime p:EPOCHSECONDS
+    [[ -r $cache ]] && reply=("${{(@f)$(<$cache)}}")
+    if (( ! $#reply ||
+          reply[1] + {complete_function}_vttls[$1] < EPOCHSECONDS )); then
+        sh -c "${complete_function}_refresh" sh \\
+            "${{{complete_function}_vcmds[$1]}}" "$cache" \\
+            "${{{complete_function}_vtimeouts[$1]}}" \\
+            "${{{complete_function}_vindexed[$1]}}"
+        [[ -r $cache ]] && reply=("${{(@f)$(<$cache)}}")
+    fi
+    if (( {complete_function}_vindexed[$1] )); then
+        # only the values starting with the word, from the index
+        reply=()
+        [[ -r $cache.index ]] && reply=(${{(f)"$(
+            sh -c "${complete_function}_look" sh $cache.index "$PREFIX")"}})
+        return
+    fi
+    reply=("${{(@)reply[2,-1]}}")
+}}
+"""
+
+# the options of the commands overriding the global ones with values, without
+# values of their own, not to complete the values of the global ones
+ZSH_VALUES_OVERRIDDEN = """typeset -gA {complete_function}_voverridden
+{complete_function}_voverridden=(
+{overridden_block}
+)
+"""
+
+ZSH_TRACE = """
+# with $COMPLETIONS_TRACE set, each completion request appends a line to the
+# file: the time, the shell, the program, the command, the number of
+# candidates and the elapsed microseconds. See `completions stats`.
+{complete_function}_trace() {{
+    [[ -n $2 ]] || return 0
+    printf '%s\\tzsh\\t%s\\t%s\\t%s\\t%.0f\\n' ${{EPOCHREALTIME%.*}} {program} "$1" \\
+        $compstate[nmatches] $(( (EPOCHREALTIME - $2) * 1000000 )) \\
+        >> $COMPLETIONS_TRACE
+}}
+"""
+
+ZSH_VALUES_LOOKUP = """
+    # completing for the value of an option
+    word=${{words[CURRENT-1]}}
+    local key="{key}"
+{fallback}
+    if [[ $word == -* ]] &&
+            (( ${{+{complete_function}_vindex[$key]}} )); then
+        local -a reply
+        {complete_function}_values ${{{complete_function}_vindex[$key]}}
+        compadd -a reply
+        ret=$?
+        [[ -n $COMPLETIONS_TRACE ]] && {complete_function}_trace "$com" "$start"
+        return ret
+    fi
+"""
+
+ZSH_WITH_COMMANDS = """#compdef {name}
+
+# lookup tables, built once when the completion file is loaded. Commands
+# are indexed by their space-joined path, index 0 is the program itself
+if (( ! ${{+{complete_function}_index}} )); then
+    typeset -gA {complete_function}_index
+    {complete_function}_index=(
+{command_index}
+    )
+    typeset -ga {complete_function}_opts_0 {complete_function}_coms_0
+    {complete_function}_opts_0=({global_options})
+    {complete_function}_coms_0=({commands})
+{command_block}{descs_block}
+{values_block}
+fi
+{trace_block}
+{complete_function}() {{
+    local com word index start ret
+    # timed if traced
+    [[ -n $COMPLETIONS_TRACE ]] && zmodload -F zsh/datetime p:EPOCHREALTIME &&
+        start=$EPOCHREALTIME
+
+    # walk down the command tree, one lookup for each word typed
+    for word in ${{words[2,CURRENT-1]}}; do
+        [[ $word == -* ]] && continue
+        if (( ${{+{complete_function}_index[${{com:+$com }}$word]}} )); then
+            com="${{com:+$com }}$word"
+        fi
+    done
+    [[ -n $com ]] && index=${{{complete_function}_index[$com]}}
+{values_lookup}
+    if [[ ${{words[CURRENT]}} == -* && -n $index ]]; then
+        {describe} 'option' {complete_function}_opts_${{index}}{inherited}
+    elif [[ ${{words[CURRENT]}} == -* ]]; then
+        {describe} 'option' {complete_function}_opts_0
+    elif (( ${{+parameters[{complete_function}_coms_${{index:-0}}]}} )); then
+        {describe} 'command' {complete_function}_coms_${{index:-0}}
+    else
+        # fallback to file completion
+        _arguments '*:file:_files'
+    fi
+    ret=$?
+
+    [[ -n $COMPLETIONS_TRACE ]] && {complete_function}_trace "$com" "$start"
+    return ret
+}}
+
+{compdef_block}
+{complete_function} "$@"
+"""
+
+ZSH_WITHOUT_COMMANDS = """#compdef {name}
+{values_block}{descs_block}{trace_block}
+{complete_function}() {{
+    local cur word com start ret
+    # timed if traced
+    [[ -n $COMPLETIONS_TRACE ]] && zmodload -F zsh/datetime p:EPOCHREALTIME &&
+        start=$EPOCHREALTIME
+
+    cur=${{words[${{#words[@]}}]}}
+{values_lookup}
+    if [[ ${{cur}} == -* ]]; then
+        state="option"
+        opts=({options})
+        {describe} 'option' opts
+    else
+        # fallback to file completion
+        _arguments '*:file:_files'
+    fi
+    ret=$?
+
+    [[ -n $COMPLETIONS_TRACE ]] && {complete_function}_trace "$com" "$start"
+    return ret
+}}
+
+{compdef_block}
+{complete_function} "$@"
+"""
+
+ZSH_WITH_COMMANDS_COMMAND = (
+    "    typeset -ga {complete_function}_opts_{index}\n"
+    "    {complete_function}_opts_{index}=({options})")
+
+ZSH_WITH_COMMANDS_SUBCOMMAND = (
+    "    typeset -ga {complete_function}_coms_{index}\n"
+    "    {complete_function}_coms_{index}=({commands})")
+
+# inherited, the global options not overridden by a command, if it
+# overrides any
+ZSH_WITH_COMMANDS_INHERITED = (
+    "    typeset -ga {complete_function}_gopts_{index}\n"
+    "    {complete_function}_gopts_{index}=({options})")
+
+ZSH_WITH_COMMANDS_INDEX = "        {command!r} {index}"
+
+ZSH_COMPDEF = "compdef {complete_function} {name}"
+
+# minified, the options and the subcommands are (name, index of the
+# description) pairs, with the descriptions stored once in a table
+ZSH_DESCS = """
+# the descriptions, each stored once, referred to by their indexes
+typeset -ga {complete_function}_descs
+{complete_function}_descs=({descs})
+
+# _describe the items of one or two (name, index) arrays
+{complete_function}_describe() {{
+    local tag=$1 name index
+    local -a items1 items2
+    for name index in ${{(P)2}}; do
+        items1+=("$name:${{{complete_function}_descs[index]}}")
+    done
+    if [[ $3 == -- ]]; then
+        for name index in ${{(P)4}}; do
+            items2+=("$name:${{{complete_function}_descs[index]}}")
+        done
+        _describe $tag items1 -- items2
+    else
+        _describe $tag items1
+    fi
+}}
+"""
+
+ZSH_DESCRIBE = "{complete_function}_describe"
+
+# the global options for the commands, when inherited
+ZSH_INHERITED = " -- {complete_function}_opts_0"
+# the ones not overridden instead, for a command overriding any
+ZSH_INHERITED_OVERRIDDEN = (
+    " -- ${{${{parameters[{complete_function}_gopts_$index]:+"
+    "{complete_function}_gopts_$index}}:-{complete_function}_opts_0}}")
+ZSH_VALUES_FALLBACK = (
+    "    (( ${{+{complete_function}_vindex[$key]}} )) || key=$word")
+# unless overridden by the command, if any command does
+ZSH_VALUES_FALLBACK_OVERRIDDEN = (
+    "    (( ${{+{complete_function}_vindex[$key]}} ||\n"
+    "       ${{+{complete_function}_voverridden[$key]}} )) || key=$word")
+
+# the words not quoted for zsh, `=` not at the start, where it would expand
+ZSH_PLAIN = re.compile(r'[\w@%+,./-][\w@%+=,./-]*')
+
+
+def _escape_colon(name):
+    """Escape colon in command/option name for zsh"""
+    return name.replace(':', '\\:')
+
+
+def _zsh_quote(string):
+    """Quote a string for zsh, unless it is plain"""
+    if ZSH_PLAIN.fullmatch(string):
+        return string
+    return "'%s'" % string.replace("'", "'\\''")
+
+
+def _zsh_describe(items, descs=None):
+    """Format the name:description pairs for zsh's `_describe`
+
+    With the indexes of the descriptions `descs`, the name and the index of
+    its description instead, to be described by `ZSH_DESCS`.
+    """
+    if descs is not None:
+        return ' '.join('%s %d' % (_zsh_quote(_escape_colon(name)),
+                                   descs[desc]) for name, desc in items)
+    return ' '.join(
+        "'%s'" % (_escape_colon(name) + ':' + _escape_colon(desc)).replace(
+            "'", "'\\''") for name, desc in items)
+
+
+def _zsh_desc_table(options, commands=None):
+    """The indexes of the distinct descriptions, from 1 as zsh's arrays"""
+    return {
+        desc: index
+        for index, desc in enumerate(
+            dict.fromkeys(_descriptions(options, commands)), 1)
+    }
+
+
+def _zsh_describe_function(complete_function, minify=False):
+    """The function describing the options and the commands"""
+    if not minify:
+        return '_describe'
+    return _fragment(ZSH_DESCRIBE, minify).format(
+        complete_function=complete_function)
+
+
+def _zsh_compdef_block(complete_function, name, fullpath=None):
+    """Register the function for the program, and its path if known
+
+    So that the later completion requests call the function, instead of
+    loading the completion file again.
+    """
+    compdef_block = [
+        ZSH_COMPDEF.format(complete_function=complete_function, name=name)
+    ]
+    if fullpath:
+        compdef_block.append(
+            ZSH_COMPDEF.format(complete_function=complete_function,
+                               name=fullpath))
+    return '\n'.join(compdef_block)
+
+
+def assemble_zsh_with_commands(name, # pylint: disable=too-many-arguments
+                               complete_function,
+                               global_options,
+                               commands,
+                               fullpath=None,
+                               providers=None,
+                               inherit=True,
+                               minify=False):
+    """Assemble zsh completions with commands
+
+    The options and the subcommands of each command go to global arrays when
+    the file is loaded, and the command paths are indexed by an associative
+    array, so that a completion request is a hash lookup for each word and a
+    `_describe` call. The global options are in one array, described along
+    with the ones of the command if inherited, less the ones it overrides.
+    With `minify`, each description is stored once, and the arrays refer to
+    it by its index.
+    """
+    descs = _zsh_desc_table(global_options, commands) if minify else None
+    tables = _value_tables(providers, commands, inherit)
+    overridden = inherit and any(
+        option in global_options
+        for _, command in _command_paths(commands)
+        for option in command.options)
+
+    def command_block():
+        command_template = _template(ZSH_WITH_COMMANDS_COMMAND, minify)
+        subcommand_template = _template(ZSH_WITH_COMMANDS_SUBCOMMAND, minify)
+        inherited_template = _template(ZSH_WITH_COMMANDS_INHERITED, minify)
+        for index, (_, command) in enumerate(_command_paths(commands), 1):
+            yield command_template.format(
+                complete_function=complete_function,
+                index=index,
+                options=_zsh_describe(command.options.items(), descs))
+            if overridden and any(option in global_options
+                                  for option in command.options):
+                yield inherited_template.format(
+                    complete_function=complete_function,
+                    index=index,
+                    options=_zsh_describe(
+                        ((option, desc)
+                         for option, desc in global_options.items()
+                         if option not in command.options), descs))
+            if command.commands:
+                yield subcommand_template.format(
+                    complete_function=complete_function,
+                    index=index,
+                    commands=_zsh_describe(
+                        ((comname, subcommand.desc)
+                         for comname, subcommand in command.commands.items()),
+                        descs))
+
+    index_entry = _template(ZSH_WITH_COMMANDS_INDEX, minify)
+    return _render(
+        _template(ZSH_WITH_COMMANDS, minify),
+        name=name,
+        complete_function=complete_function,
+        trace_block=_template(ZSH_TRACE, minify).format(
+            complete_function=complete_function, program=_sh_quote(name)),
+        command_index=(index_entry.format(command=' '.join(compath),
+                                          index=index)
+                       for index, (compath, _) in enumerate(
+                           _command_paths(commands), 1)),
+        command_block=command_block(),
+        descs_block=_descs_block(
+            ZSH_DESCS, complete_function, descs,
+            lambda desc: _zsh_quote(_escape_colon(desc)), minify),
+        values_block=_values_block(ZSH_VALUES, name, complete_function,
+                                   tables, 1, entry="    {key!r} {index}",
+                                   overridden=ZSH_VALUES_OVERRIDDEN,
+                                   minify=minify),
+        values_lookup=_values_lookup(
+            ZSH_VALUES_LOOKUP, complete_function, tables,
+            '${com:+$com }$word',
+            _template(
+                ZSH_VALUES_FALLBACK_OVERRIDDEN if tables[2] else
+                ZSH_VALUES_FALLBACK, minify).format(
+                    complete_function=complete_function) if inherit else '',
+            minify),
+        describe=_zsh_describe_function(complete_function, minify),
+        inherited=_fragment(
+            ZSH_INHERITED_OVERRIDDEN if overridden else ZSH_INHERITED,
+            minify).format(
+                complete_function=complete_function) if inherit else '',
+        compdef_block=_zsh_compdef_block(complete_function, name, fullpath),
+        global_options=_zsh_describe(global_options.items(), descs),
+        commands=_zsh_describe(
+            ((comname, command.desc)
+             for comname, command in commands.items()), descs),
+    )
+
+
+def assemble_zsh_without_commands(name, # pylint: disable=too-many-arguments
+                                  complete_function,
+                                  options,
+                                  fullpath=None,
+                                  providers=None,
+                                  minify=False):
+    """Assemble zsh completions without commands"""
+    descs = _zsh_desc_table(options) if minify else None
+    tables = _value_tables(providers)
+    return _render(
+        _template(ZSH_WITHOUT_COMMANDS, minify),
+        name=name,
+        complete_function=complete_function,
+        trace_block=_template(ZSH_TRACE, minify).format(
+            complete_function=complete_function, program=_sh_quote(name)),
+        values_block=_values_block(ZSH_VALUES, name, complete_function,
+                                   tables, 1, entry="    {key!r} {index}",
+                                   minify=minify),
+        descs_block=_descs_block(
+            ZSH_DESCS, complete_function, descs,
+            lambda desc: _zsh_quote(_escape_colon(desc)), minify),
+        values_lookup=_values_lookup(ZSH_VALUES_LOOKUP, complete_function,
+                                     tables, '$word', minify=minify),
+        describe=_zsh_describe_function(complete_function, minify),
+        compdef_block=_zsh_compdef_block(complete_function, name, fullpath),
+        options=_zsh_describe(options.items(), descs))
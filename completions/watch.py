@@ -0,0 +1,188 @@
+"""
+Watch configuration files, installing the completions again once changed
+
+The directories of the files are watched by inotify on Linux, so that the
+files replaced by editors (written to another file and renamed) are seen as
+well, otherwise the files are polled by their stat. A burst of changes, such
+as the several writes of one save, is taken as one change, once quiet for
+the debounce time.
+
+Only the configuration files changed are loaded again, and the installers
+write the scripts only if the code generated is changed.
+"""
+import os
+import select
+import struct
+import time
+from os import path
+
+from completions import log
+from completions.batch import load_config
+
+# inotify(7): the events of the files written, moved, created or deleted
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+           | IN_DELETE | IN_MODIFY)
+# struct inotify_event, followed by the name of `len` bytes
+IN_EVENT = struct.Struct('iIII')
+
+
+def _signature(filename):
+    """What tells a file is changed, None if it doesn't exist"""
+    try:
+        fstat = os.stat(filename)
+    except OSError:
+        return None
+    return fstat.st_mtime_ns, fstat.st_size, fstat.st_ino
+
+
+class _Inotify:
+    """The events of the files in their directories, by inotify"""
+    def __init__(self, filenames):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        # the files by the watch descriptors of their directories and names
+        self.files = {}
+        try:
+            for filename in filenames:
+                dirname, basename = path.split(path.realpath(filename))
+                wdesc = libc.inotify_add_watch(self.fd, dirname.encode(),
+                                               IN_MASK)
+                if wdesc < 0:
+                    raise OSError(ctypes.get_errno(),
+                                  'inotify_add_watch failed: %s' % dirname)
+                self.files[(wdesc, basename.encode())] = filename
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def wait(self, timeout=None):
+        """Wait for the events, return the files changed, None if timed out"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return None
+        changed = set()
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wdesc, _, _, length = IN_EVENT.unpack_from(data, offset)
+            offset += IN_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if (wdesc, name) in self.files:
+                changed.add(self.files[(wdesc, name)])
+        return changed
+
+    def close(self):
+        """Stop watching"""
+        os.close(self.fd)
+
+
+class _Poll:
+    """The changes of the files, by polling their stat"""
+    def __init__(self, filenames, interval=0.5):
+        self.interval = interval
+        self.signatures = {
+            filename: _signature(filename)
+            for filename in filenames
+        }
+
+    def wait(self, timeout=None):
+        """Wait for the changes, return the files changed, None if timed out"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            changed = set()
+            for filename, signature in self.signatures.items():
+                now = _signature(filename)
+                if now != signature:
+                    self.signatures[filename] = now
+                    changed.add(filename)
+            if changed:
+                return changed
+            if deadline is not None and time.time() >= deadline:
+                return None
+            time.sleep(self.interval if deadline is None else
+                       max(min(self.interval, deadline - time.time()), 0))
+
+    def close(self):
+        """Stop watching"""
+
+
+def changes(filenames, interval=0.5, debounce=0.2, poll=False):
+    """Watch the files, yield the lists of the ones changed
+
+    A list is yielded once no more changes come within `debounce` seconds.
+    The files deleted are not yielded until they are back. With `poll`, or
+    where inotify is not available, the files are polled every `interval`
+    seconds.
+    """
+    watcher = None
+    if not poll:
+        try:
+            watcher = _Inotify(filenames)
+        except (OSError, AttributeError, TypeError):
+            log('inotify is not available, polling the files instead.')
+    watcher = watcher or _Poll(filenames, interval)
+    # the events leaving a file the same, or deleted for now, are ignored
+    signatures = {filename: _signature(filename) for filename in filenames}
+    try:
+        while True:
+            changed = watcher.wait()
+            while True:
+                more = watcher.wait(debounce)
+                if more is None:
+                    break
+                changed |= more
+            changed = [
+                filename for filename in filenames if filename in changed
+                and _signature(filename) not in (None, signatures[filename])
+            ]
+            for filename in changed:
+                signatures[filename] = _signature(filename)
+            if changed:
+                yield changed
+    finally:
+        watcher.close()
+
+
+def install(config, shells, cache=False, **kwargs):
+    """Load a configuration file and install its completions for the shells
+
+    The other keyword arguments are passed to `Completions.generate()`.
+    Returns whether it succeeded, the errors are logged.
+    """
+    try:
+        completions = load_config(config, cache=cache)
+        for shell in shells:
+            completions.generate(shell, auto=True, **kwargs)
+    except Exception as exc: # pylint: disable=broad-except
+        log('Failed to install for %r: %s', config, exc)
+        return False
+    return True
+
+
+def watch(configs, shells, interval=0.5, debounce=0.2, poll=False, **kwargs):
+    """Install the completions, and again once the configuration files change
+
+    See `changes()` for the watching and `install()` for the installing.
+    Runs until interrupted.
+    """
+    configs = [path.abspath(config) for config in configs]
+    for config in configs:
+        install(config, shells, **kwargs)
+    log('Watching %s file(s) for changes ...', len(configs))
+    for changed in changes(configs, interval, debounce, poll):
+        for config in changed:
+            log('Changed: %r', config)
+            install(config, shells, **kwargs)
@@ -32,7 +32,7 @@ setup(
     author_email='pwwang@pwwang.com',
     license='MIT',
     entry_points={"console_scripts": ["completions = completions:main"]},
-    packages=['completions'],
+    packages=['completions', 'completions.templates'],
     package_dir={"": "."},
     package_data={"completions": ["*.bak"]},
     install_requires=['colorama', 'pyparam', 'python-simpleconf'],